@@ -1,15 +1,36 @@
 import streamlit as st
-import google.generativeai as genai
 import json
 import time
-import asyncio
-import edge_tts
-import tempfile
-import requests
 import os
 import urllib.parse
 import re
 
+from script_architect.condense import estimate_tokens
+from script_architect.latency import get_latency_tracker
+from script_architect.llm_cache import LLM_CACHE_ENABLED, get_llm_cache
+from script_architect.pipeline import (
+    CONTENT_MODES,
+    DEEP_DIVE,
+    DEFAULT_VARIANT_COUNT,
+    EDITABLE_SECTIONS,
+    SCRIPT_SECTIONS,
+    SOURCE_TYPES,
+    VARIANT_FIELDS,
+    VIDEO_LENGTHS,
+    assemble_script_text,
+    condense_research_for_script,
+    generate_packaging_variants,
+    generate_script_package,
+    generate_youtube_bundle,
+    perform_grounded_research,
+    regenerate_script_section,
+    splice_script_section,
+)
+from script_architect.ratelimit import PRIORITY_BACKGROUND, rate_limiter_stats, request_priority
+from script_architect.scheduler import StageScheduler
+from script_architect.telemetry import get_telemetry
+from script_architect.tts import TTS_DEFAULT_CONCURRENCY, VOICES, generate_audio_sync, get_audio_spill, get_tts_cache
+
 # --- PAGE CONFIGURATION ---
 st.set_page_config(
     page_title="Script Architect Pro",
@@ -18,230 +39,162 @@ st.set_page_config(
 )
 
 # --- PROFESSIONAL LIGHT THEME CSS ---
-st.markdown("""
-    <style>
-    :root {
-        --primary: #2563eb;
-        --bg-main: #f8fafc;
-        --bg-card: #ffffff;
-        --border: #e2e8f0;
-        --text-main: #1e293b;
-        --text-secondary: #64748b;
-    }
-    
-    .stApp { background-color: var(--bg-main); color: var(--text-main); }
-    
-    /* Global Text visibility */
-    p, span, label, .stMarkdown, h1, h2, h3, .stMetric label { 
-        color: var(--text-main) !important; 
-    }
-    
-    .stCaption { color: var(--text-secondary) !important; }
-
-    /* Input & Select Box Styling */
-    .stTextInput input, .stTextArea textarea, [data-baseweb="select"], .stSelectbox div {
-        background-color: white !important;
-        border: 1px solid var(--border) !important;
-        color: var(--text-main) !important;
-    }
-
-    /* Buttons */
-    .stButton>button {
-        background-color: var(--primary); color: white; border-radius: 8px; 
-        height: 3.5em; font-weight: 600; width: 100%; border: none;
-        transition: all 0.2s ease-in-out;
-        box-shadow: 0 1px 2px rgba(0,0,0,0.05);
-    }
-    .stButton>button:hover { background-color: #1d4ed8; transform: translateY(-1px); }
-
-    /* Tabs */
-    .stTabs [data-baseweb="tab-list"] { gap: 24px; border-bottom: 1px solid var(--border); }
-    .stTabs [data-baseweb="tab"] {
-        height: 50px; background-color: transparent;
-        color: var(--text-secondary); font-weight: 600;
-        border-bottom: 2px solid transparent;
-    }
-    .stTabs [aria-selected="true"] { 
-        color: var(--primary) !important; 
-        border-bottom-color: var(--primary) !important; 
-    }
-
-    /* Analysis Result Cards */
-    .metric-badge {
-        background-color: #eff6ff; color: #1e40af; border: 1px solid #bfdbfe;
-        padding: 4px 12px; border-radius: 6px; font-weight: bold; font-size: 0.9em;
-    }
-    .report-card {
-        background-color: white; padding: 24px; border-radius: 12px;
-        border: 1px solid var(--border); margin-bottom: 20px;
-        box-shadow: 0 4px 6px -1px rgba(0, 0, 0, 0.05);
-    }
-    
-    /* Metrics Visibility */
-    [data-testid="stMetricValue"] { color: var(--primary) !important; }
-    </style>
-    """, unsafe_allow_html=True)
-
-# --- AUDIO LOGIC (EDGE-TTS) ---
-
-async def text_to_speech_edge(text, voice):
-    communicate = edge_tts.Communicate(text, voice)
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as tmp_file:
-        await communicate.save(tmp_file.name)
-        return tmp_file.name
-
-def generate_audio_sync(text, voice):
-    try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop.run_until_complete(text_to_speech_edge(text, voice))
-    except Exception as e:
-        st.error(f"Audio Generation Error: {e}")
-        return None
-
-# --- BACKEND LOGIC (GEMINI 2.5 FLASH) ---
-
-def call_gemini(api_key, prompt, system_instruction="", use_search=False, is_json=False):
-    if not use_search:
-        genai.configure(api_key=api_key)
-        gen_config = {"response_mime_type": "application/json"} if is_json else None
-        
-        model = genai.GenerativeModel(
-            model_name='gemini-2.5-flash',
-            system_instruction=system_instruction,
-            generation_config=gen_config
+@st.cache_resource
+def load_css():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "style.css"), encoding="utf-8") as f:
+        return f"<style>\n{f.read()}</style>"
+
+st.markdown(load_css(), unsafe_allow_html=True)
+
+# --- SPECULATIVE BACKGROUND PIPELINE ---
+
+PARAM_KEYS = ['topic_param', 'mode_param', 'length_param', 'source_param', 'matrix_param', 'angle_param']
+STAGE_ICONS = {"pending": "⏸️", "running": "⏳", "done": "✅", "failed": "⚠️", "cancelled": "✖️"}
+
+def at_background_priority(stage):
+    """Speculative Gemini calls queue behind anything a user is actively waiting on."""
+    def run(*args):
+        with request_priority(PRIORITY_BACKGROUND):
+            return stage(*args)
+    return run
+
+def get_scheduler():
+    if 'scheduler' not in st.session_state:
+        st.session_state['scheduler'] = StageScheduler()
+    return st.session_state['scheduler']
+
+def schedule_research_and_script(api_key):
+    """Starts research now and script synthesis as soon as research is done."""
+    params = {key: st.session_state[key] for key in PARAM_KEYS}
+
+    def research_stage():
+        research = perform_grounded_research(
+            topic=params['topic_param'],
+            mode=params['mode_param'],
+            source_type=params['source_param'],
+            angle=params['angle_param'],
+            length=params['length_param'],
+            api_key=api_key
         )
-        for delay in [1, 2, 4, 8, 16]:
-            try:
-                response = model.generate_content(prompt)
-                return response.text
-            except Exception as e:
-                if delay == 16:
-                    return f"Error: {str(e)}"
-                time.sleep(delay)
-    else:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}"
-        headers = {'Content-Type': 'application/json'}
-        data = {
-            "contents": [{"parts": [{"text": prompt}]}],
-            "systemInstruction": {"parts": [{"text": system_instruction}]},
-            "tools": [{"google_search": {}}] 
-        }
-        
-        for delay in [1, 2, 4, 8, 16]:
-            try:
-                response = requests.post(url, headers=headers, json=data, timeout=60)
-                response.raise_for_status()
-                result = response.json()
-                if 'candidates' in result and len(result['candidates']) > 0:
-                    parts = result['candidates'][0]['content']['parts']
-                    text_parts = [part.get('text', '') for part in parts if 'text' in part]
-                    return '\n'.join(text_parts)
-                else:
-                    return f"Error: Unexpected response format"
-            except requests.exceptions.RequestException as e:
-                if delay == 16:
-                    return f"Error: {str(e)}\nResponse Content: {e.response.text if e.response else 'No response content'}"
-                time.sleep(delay)
-            except Exception as e:
-                if delay == 16:
-                    return f"Error: {str(e)}"
-                time.sleep(delay)
-            
-def perform_grounded_research(topic, mode, source_type, angle, length, api_key):
-    """Executes targeted research based on the user's angle and parameters."""
-    system_instruction = "You are an expert Research Assistant. Always search the web for current, accurate information. Your goal is to fact-check and find data that supports the Creator's Angle."
-    
-    prompt = f"""
-    TOPIC: {topic}
-    SOURCE TYPE: {source_type}
-    VIDEO LENGTH: {length}
-    CREATOR'S ANGLE / DRAFT: {angle}
-    
-    TASK: Execute targeted web searches to gather factual context that specifically supports, verifies, or fills the gaps in the "CREATOR'S ANGLE". 
-    
-    INSTRUCTIONS:
-    1. Do not just summarize the topic. Actively look for data, recent news, or historical parallels that make the Creator's Angle stronger.
-    2. If the Creator's Angle is missing specific facts (like exact dates, character names, technology versions, or company statements), find them.
-    3. If the Video Length is "Deep Dive (10+ mins)", gather extensive details and multiple perspectives.
-    4. Provide your findings as a factual briefing. Cite your sources with URLs.
-    """
-    return call_gemini(api_key, prompt, system_instruction, use_search=True)
-
-def generate_script_package(mode, topic, research, angle, matrix, source_type, length, api_key):
-    personas = {
-        "Film & Series Analysis": "Master YouTube Film Critic. Focus on narrative, character arcs, and thematic depth.",
-        "Tech News & Investigative": "Investigative Tech YouTuber. Focus on clarity, impact, and engaging storytelling.",
-        "Educational Technology": "Senior Developer turned YouTuber. Explain things naturally, like a mentor talking to a junior."
-    }
-    
-    prompt = f"""
-    TOPIC: {topic}
-    SOURCE TYPE: {source_type}
-    VIDEO LENGTH: {length}
-    CREATOR'S DRAFT / UNIQUE ANGLE: {angle}
-    SELECTED MATRIX (Tone/Style): {matrix}
-    TARGETED RESEARCH: {research}
-    
-    TASK: You are a professional, conversational YouTube scriptwriter. Your goal is to refine the "CREATOR'S DRAFT" into a highly engaging, human-sounding script ready for voiceover.
-    
-    CRITICAL INSTRUCTIONS:
-    1. LENGTH ADAPTATION: The target video length is '{length}'. 
-       - If it is a YouTube Short, make the script extremely punchy, fast-paced, and under 150 words total.
-       - If it is Mid-length or Deep Dive, flesh out the arguments with natural pacing.
-    2. HUMAN TONE: The script MUST sound like a real person talking to a camera. Use conversational phrasing, rhetorical questions, and natural transitions. AVOID robotic listicles.
-    3. ANGLE-FIRST REFINEMENT: Preserve the creator's unique perspective. Only use the "TARGETED RESEARCH" to factually support their points. Do NOT dump all the research into the script.
-    4. ALIGNMENT: Match the tone indicated in the "SELECTED MATRIX".
-    5. ESCAPE CHARACTERS: Ensure ALL double quotes inside your script text are properly escaped (e.g., \\"Like this\\") so the JSON remains completely valid.
-    
-    JSON SCHEMA REQUIREMENTS:
-    {{
-      "thematic_resonance": {{ "real_world_event": "String", "explanation": "Detailed parallel based on angle" }},
-      "character_matrix": [ {{ "name": "Name", "role": "Main/Side", "arc_score": 0, "ghost_vs_truth": "String" }} ],
-      "technical_report": {{ "script": 0, "direction": 0, "editing": 0, "acting": 0 }},
-      "viral_title": "String (Catchy YouTube Title)",
-      "hook_script": "String (A punchy, conversational opening hook)",
-      "full_script": {{ 
-          "intro": "Conversational intro flowing from the hook.",
-          "act1": "Conversational Act 1.",
-          "act2": "Conversational Act 2.",
-          "act3": "Conversational Act 3.",
-          "outro": "Natural conclusion and call-to-action."
-      }},
-      "script_outline": ["Brief point 1", "Brief point 2", "Brief point 3"],
-      "seo_metadata": {{ "description": "String", "tags": ["tag1", "tag2"] }}
-    }}
-    """
-    
-    result = call_gemini(api_key, prompt, personas.get(mode), is_json=True)
-    try:
-        clean = result.replace("```json", "").replace("```", "").strip()
-        return json.loads(clean)
-    except Exception as e:
-        return {"error": f"Synthesis failed to return valid JSON. Error: {str(e)}", "raw": result}
-
-def generate_youtube_bundle(api_key, script_text):
-    prompt = f"""
-    Analyze the following YouTube script and create a complete SEO and packaging bundle.
-    
-    SCRIPT:
-    {script_text}
-    
-    JSON SCHEMA REQUIREMENTS:
-    {{
-        "viral_title": "String (A high-CTR, emotional, and catchy YouTube title)",
-        "description": "String (A full YouTube description including a hook, summary, and placeholder for social links)",
-        "tags": ["tag1", "tag2", "tag3", "etc (Generate 15 highly relevant SEO tags)"],
-        "hashtags": ["#tag1", "#tag2", "#tag3 (Generate 3-5 highly relevant hashtags)"],
-        "thumbnail_prompt": "String (A highly detailed, visual prompt for an AI image generator to create a catchy, high-contrast, professional YouTube thumbnail. Specify lighting, subjects, and mood.)"
-    }}
+        if research.startswith("Error:"):
+            raise RuntimeError(research)
+        return research
+
+    def script_stage(research):
+        condensed, _ = condense_research_for_script(
+            params['topic_param'], research, params['angle_param'],
+            params['matrix_param'], params['source_param'], params['length_param']
+        )
+        package = generate_script_package(
+            mode=params['mode_param'],
+            topic=params['topic_param'],
+            research=condensed,
+            angle=params['angle_param'],
+            matrix=params['matrix_param'],
+            source_type=params['source_param'],
+            length=params['length_param'],
+            api_key=api_key
+        )
+        if "error" in package:
+            raise RuntimeError(package['error'])
+        return package
+
+    scheduler = get_scheduler()
+    scheduler.submit("research", at_background_priority(research_stage), params)
+    scheduler.submit("script", at_background_priority(script_stage), params, deps=("research",))
+
+def schedule_bundle_and_voiceover(api_key, script_text, voice, tts_concurrency):
+    """Starts the content bundle and the voiceover in parallel; neither depends on the other."""
+    def bundle_stage():
+        bundle = generate_youtube_bundle(api_key, script_text)
+        if "error" in bundle:
+            raise RuntimeError(bundle['error'])
+        return bundle
+
+    def voiceover_stage():
+        audio = generate_audio_sync(script_text, voice, max_concurrency=tts_concurrency, cache=get_tts_cache())
+        return get_audio_spill().hold(audio)
+
+    scheduler = get_scheduler()
+    scheduler.submit("bundle", at_background_priority(bundle_stage), {"text": script_text})
+    scheduler.submit("voiceover", voiceover_stage, {"text": script_text, "voice": voice}, release=get_audio_spill().release)
+
+def adopt_background_result(stage, state_key, matches=None):
+    """Copies a finished speculative result into session state unless the user generated a newer one explicitly.
+
+    Returns True if it did.
     """
-    result = call_gemini(api_key, prompt, "You are a master YouTube strategist and SEO expert.", is_json=True)
-    try:
-        clean = result.replace("```json", "").replace("```", "").strip()
-        return json.loads(clean)
-    except Exception as e:
-        return {"error": f"Failed to generate bundle. Error: {str(e)}", "raw": result}
+    run = get_scheduler().get(stage)
+    if run is None or run.state != "done" or (matches and not matches(run)):
+        return False
+    if run.submitted_at <= st.session_state.get(f"{state_key}_at", 0):
+        return False
+    st.session_state[state_key] = run.result
+    st.session_state[f"{state_key}_at"] = run.submitted_at
+    return True
+
+def render_background_status():
+    scheduler = st.session_state.get('scheduler')
+    if scheduler is None:
+        return
+    rows = scheduler.status()
+    for row in rows:
+        line = f"{STAGE_ICONS[row['state']]} {row['stage'].title()}: {row['state']} ({row['elapsed']:.0f}s)"
+        if row['error']:
+            line += f" — {row['error'][:120]}"
+        st.caption(line)
+
+    # Rerun the whole app once per newly finished stage so the tabs pick up its result.
+    finished = {(row['stage'], row['fingerprint']) for row in rows if row['state'] == "done"}
+    if not finished <= st.session_state.setdefault('background_seen', set()):
+        st.session_state['background_seen'] |= finished
+        st.rerun()
+
+if hasattr(st, "fragment"):
+    render_background_status = st.fragment(run_every="2s")(render_background_status)
+
+# --- DIAGNOSTICS ---
+
+def render_diagnostics():
+    """Per-stage timings, counters and recent spans, collected across every session in this process."""
+    telemetry = get_telemetry()
+    stage_stats = telemetry.stage_stats()
+    if not stage_stats:
+        st.caption("No pipeline stages have run yet.")
+        return
+    st.dataframe(
+        [{"stage": name, "runs": row['count'], "errors": row['errors'], "p50 (s)": round(row['p50_s'], 2),
+          "p95 (s)": round(row['p95_s'], 2), "max (s)": round(row['max_s'], 2)}
+         for name, row in sorted(stage_stats.items(), key=lambda item: -item[1]['p95_s'])],
+        hide_index=True, use_container_width=True
+    )
+    counters = telemetry.counters()
+    if counters:
+        st.caption(" · ".join(f"{name}: {value:,}" for name, value in counters.items()))
+    st.markdown("**Recent spans**")
+    for span in list(telemetry.recent)[-10:][::-1]:
+        line = f"{'❌' if span.status == 'error' else '✅'} `{span.name}` {span.duration:.2f}s"
+        if span.status == 'error':
+            line += f" — {span.attrs.get('error', '')[:120]}"
+        st.caption(line)
+    col1, col2 = st.columns(2)
+    col1.download_button("⬇️ Spans (.jsonl)", telemetry.to_jsonl(), file_name="script_architect_spans.jsonl",
+                         mime="application/x-ndjson")
+    col2.download_button("⬇️ Metrics (.prom)", telemetry.to_prometheus(), file_name="script_architect.prom",
+                         mime="text/plain")
+
+# --- TAB ISOLATION ---
+
+def isolated(tab):
+    """Runs a tab as a fragment, so interacting with its widgets reruns only that tab."""
+    return st.fragment(tab) if hasattr(st, "fragment") else tab
+
+def publish(key, value):
+    """Stores a value that other tabs display; reruns the whole app if it changed so they are not left stale."""
+    changed = st.session_state.get(key) != value
+    st.session_state[key] = value
+    if changed:
+        st.rerun()
 
 # --- APPLICATION UI ---
 
@@ -257,22 +210,50 @@ with st.sidebar:
     else:
         st.warning("⚠️ API Key required")
     
+    st.divider()
+    reuse_cached = st.toggle("♻️ Reuse cached AI responses", value=True,
+                             help="Identical requests (same prompt, instructions and mode) are answered from the local response cache. Turn off to force a fresh generation.")
+    refresh_cache = not reuse_cached
+    if LLM_CACHE_ENABLED:
+        llm_stats = get_llm_cache().stats()
+        st.caption(f"Response cache: {llm_stats['hits']} hits · {llm_stats['coalesced']} coalesced · {llm_stats['misses']} generated")
+    limiter_stats = rate_limiter_stats(api_key) if api_key else None
+    if limiter_stats:
+        queued = limiter_stats['queued_by_priority']
+        st.caption(
+            f"Gemini queue: {limiter_stats['queued']} waiting ({queued['interactive']} interactive · {queued['background']} background · {queued['batch']} batch) · "
+            f"avg wait {limiter_stats['mean_wait_s']:.1f}s, max {limiter_stats['max_wait_s']:.1f}s · {limiter_stats['throttled']} rate-limit pauses"
+        )
+    for latency_key, latency in get_latency_tracker().stats().items():
+        if latency_key.startswith("research/") and latency['count']:
+            st.caption(
+                f"Search {latency_key.split('/')[1]}: p50 {latency['p50_s']:.1f}s · p95 {latency['p95_s']:.1f}s · "
+                f"{latency['hedged']} hedged ({latency['hedge_wins']} won)"
+            )
+
+    speculative = st.toggle("⚡ Run next steps in the background", value=True,
+                            help="Starts research as soon as parameters are saved, drafts the script when research lands, and pre-generates the bundle and voiceover for the finalized script.")
+    render_background_status()
+
+    with st.expander("🩺 Diagnostics"):
+        render_diagnostics()
+
     st.divider()
     if st.button("Reset All Steps"):
+        if 'scheduler' in st.session_state:
+            st.session_state['scheduler'].cancel_all()
+        get_audio_spill().release(st.session_state.get('voiceover_audio'))
         st.session_state.clear()
         st.rerun()
 
-# --- 5 LINEAR WORKFLOW TABS ---
-tab1, tab2, tab3, tab4, tab5 = st.tabs([
-    "1. Parameters", 
-    "2. Ground Research", 
-    "3. Generated Script", 
-    "4. Voiceover",
-    "5. Content Bundle"
-])
+adopt_background_result("research", "research")
+if adopt_background_result("script", "package", matches=lambda run: run.dep_results.get("research") == st.session_state.get('research')):
+    st.session_state['speculate_bundle'] = True
+adopt_background_result("bundle", "yt_bundle", matches=lambda run: run.inputs["text"] == st.session_state.get('final_script_text'))
 
 # --- TAB 1: PARAMETERS ---
-with tab1:
+@isolated
+def parameters_tab(api_key, speculative):
     st.subheader("Step 1: Set Project Parameters & Angle")
     st.info("Define the scope, tone, and your unique perspective before the AI conducts its research.")
     
@@ -282,17 +263,13 @@ with tab1:
     # 2. Base Configuration
     col_a, col_b = st.columns(2)
     with col_a:
-        active_mode = st.selectbox("Content Mode", ["Film & Series Analysis", "Tech News & Investigative", "Educational Technology"])
+        active_mode = st.selectbox("Content Mode", CONTENT_MODES)
     with col_b:
-        video_length = st.selectbox("Target Video Length", [
-            "YouTube Short (< 1 minute)", 
-            "Mid-length (3-8 mins)", 
-            "Deep Dive (10+ mins)"
-        ])
+        video_length = st.selectbox("Target Video Length", VIDEO_LENGTHS)
     
     source_type = "Original"
     if active_mode == "Film & Series Analysis":
-        source_type = st.radio("Source Material", ["Original", "Book", "Comic", "True Event", "Remake"], horizontal=True)
+        source_type = st.radio("Source Material", SOURCE_TYPES, horizontal=True)
         
     # 3. Tuning Matrix
     st.markdown('<div class="report-card">', unsafe_allow_html=True)
@@ -340,56 +317,144 @@ with tab1:
             st.session_state['matrix_param'] = str(matrix_data)
             st.session_state['angle_param'] = final_angle
             
-            st.success("✅ Parameters saved! Please click the **'2. Ground Research'** tab above to fetch supporting data.")
+            if speculative and api_key:
+                schedule_research_and_script(api_key)
+                st.session_state['params_notice'] = "✅ Parameters saved! Research has started in the background — open the **'2. Ground Research'** tab to follow along."
+            else:
+                st.session_state['params_notice'] = "✅ Parameters saved! Please click the **'2. Ground Research'** tab above to fetch supporting data."
+            # The other tabs read these parameters, so refresh the whole app rather than just this tab.
+            st.rerun()
+
+    if 'params_notice' in st.session_state:
+        st.success(st.session_state.pop('params_notice'))
 
 # --- TAB 2: GROUND RESEARCH ---
-with tab2:
+@isolated
+def research_tab(api_key, refresh_cache):
     st.subheader("Step 2: Targeted Intelligence Gathering")
     
     if 'topic_param' not in st.session_state:
         st.info("Please complete Step 1 (Parameters) first and click 'Save Parameters'.")
     else:
         st.info(f"🌐 The AI will now search the web to fact-check and find data specifically supporting your angle on **{st.session_state['topic_param']}**.")
+        research_run = get_scheduler().get("research")
+        if research_run is not None and research_run.state in ("pending", "running"):
+            st.caption("⏳ Research for these parameters is already running in the background and will appear here automatically.")
         
+        fan_out = st.checkbox(
+            "⚡ Fan-out research (parallel focused searches)",
+            value=st.session_state['length_param'] == DEEP_DIVE,
+            help="Splits the topic into facts, reception and parallels searches that run concurrently and are merged into one deduplicated briefing."
+        )
+        reuse_knowledge = st.checkbox(
+            "📚 Build on earlier research",
+            value=True,
+            help="Looks up facts from your earlier briefings on related topics in the local research index. The search is told they are already known, so it only has to fill the gaps; they are added to the briefing under 'Prior Research'."
+        )
+
         if st.button("🔍 Execute Targeted Background Research"):
             if not api_key: 
                 st.warning("Please provide an API Key in the sidebar.")
             else:
                 with st.spinner("🌐 Actively searching the web to verify and expand your angle..."):
+                    live_briefing = st.empty()
+                    streamed = []
+                    started = time.perf_counter()
+
+                    def render_research(delta):
+                        if not streamed:
+                            st.session_state['research_first_token_s'] = time.perf_counter() - started
+                        streamed.append(delta)
+                        live_briefing.markdown("".join(streamed))
+
                     st.session_state['research'] = perform_grounded_research(
                         topic=st.session_state['topic_param'],
                         mode=st.session_state['mode_param'],
                         source_type=st.session_state['source_param'],
                         angle=st.session_state['angle_param'],
                         length=st.session_state['length_param'],
-                        api_key=api_key
+                        api_key=api_key,
+                        on_chunk=render_research,
+                        refresh_cache=refresh_cache,
+                        fan_out=fan_out,
+                        reuse_knowledge=reuse_knowledge
                     )
+                    st.session_state['research_total_s'] = time.perf_counter() - started
+                    st.session_state['research_at'] = time.time()
+                    live_briefing.empty()
+                st.rerun()
 
         if 'research' in st.session_state:
             st.success("✅ Targeted Research Complete")
+            if 'research_first_token_s' in st.session_state:
+                st.caption(f"⏱️ First findings after {st.session_state['research_first_token_s']:.1f}s · complete in {st.session_state.get('research_total_s', 0):.1f}s")
             with st.expander("View Factual Briefing (What the AI found to support you)", expanded=False):
                 st.markdown(st.session_state['research'])
             st.success("🎉 **Step 2 Complete!** Please click the **'3. Generated Script'** tab above to architect your final script.")
 
 # --- TAB 3: GENERATED SCRIPT ---
-with tab3:
+@isolated
+def script_tab(api_key, refresh_cache, speculative):
     st.subheader("Step 3: Script Generation & Editing")
     
     if 'research' not in st.session_state:
         st.info("Complete Step 2 (Ground Research) to generate the final script suite.")
     else:
+        condense = st.checkbox(
+            "📉 Condense research to the token budget",
+            value=True,
+            help="Removes repeated facts and URLs and compresses the briefing to a budget for the video length before it is pasted into the script prompt."
+        )
+
         if st.button("🚀 Architect Refined Script"):
             with st.spinner(f"Synthesizing your script tailored for a {st.session_state['length_param']}..."):
+                live_title = st.empty()
+                live_hook = st.empty()
+                live_sections = {key: st.empty() for key, _ in SCRIPT_SECTIONS}
+                started = time.perf_counter()
+                st.session_state.pop('script_first_field_s', None)
+                st.session_state.pop('section_regen', None)
+                st.session_state.pop('packaging_variants', None)
+                st.session_state.pop('variant_picks', None)
+
+                def render_script_field(path, value):
+                    if not isinstance(value, str):
+                        return
+                    if path == ('viral_title',):
+                        live_title.success(f"### {value}")
+                    elif path == ('hook_script',):
+                        live_hook.markdown(f"**Hook:** {value}")
+                    elif len(path) == 2 and path[0] == 'full_script' and path[1] in live_sections:
+                        live_sections[path[1]].markdown(f"**{dict(SCRIPT_SECTIONS)[path[1]]}:** {value}")
+                    else:
+                        return
+                    st.session_state.setdefault('script_first_field_s', time.perf_counter() - started)
+
+                script_research = st.session_state['research']
+                st.session_state.pop('condense_stats', None)
+                if condense:
+                    script_research, st.session_state['condense_stats'] = condense_research_for_script(
+                        st.session_state['topic_param'], script_research, st.session_state['angle_param'],
+                        st.session_state['matrix_param'], st.session_state['source_param'], st.session_state['length_param']
+                    )
+
                 st.session_state['package'] = generate_script_package(
                     mode=st.session_state['mode_param'],
                     topic=st.session_state['topic_param'],
-                    research=st.session_state['research'],
+                    research=script_research,
                     angle=st.session_state['angle_param'],
                     matrix=st.session_state['matrix_param'],
                     source_type=st.session_state['source_param'],
                     length=st.session_state['length_param'],
-                    api_key=api_key
+                    api_key=api_key,
+                    on_field=render_script_field,
+                    refresh_cache=refresh_cache
                 )
+                st.session_state['script_total_s'] = time.perf_counter() - started
+                st.session_state['package_at'] = time.time()
+                st.session_state['speculate_bundle'] = "error" not in st.session_state['package']
+                for slot in [live_title, live_hook, *live_sections.values()]:
+                    slot.empty()
                 
         if 'package' in st.session_state:
             p = st.session_state['package']
@@ -398,6 +463,18 @@ with tab3:
                 with st.expander("View Raw Output (For Debugging)"): st.text(p.get('raw'))
             else:
                 st.success(f"### {p.get('viral_title')}")
+                if p.get('unresolved'):
+                    st.warning(f"⚠️ Still invalid after a targeted retry, left empty: {', '.join(p['unresolved'])}. Regenerate single sections below or fill them in by hand.")
+                if 'script_first_field_s' in st.session_state:
+                    st.caption(f"⏱️ First section visible after {st.session_state['script_first_field_s']:.1f}s · complete in {st.session_state.get('script_total_s', 0):.1f}s")
+                if 'condense_stats' in st.session_state:
+                    stats = st.session_state['condense_stats']
+                    st.caption(
+                        f"📉 Script prompt ~{stats['prompt_tokens_before']:,} → ~{stats['prompt_tokens_after']:,} tokens "
+                        f"(research ~{stats['tokens_before']:,} → ~{stats['tokens_after']:,} of a {stats['budget']:,} budget; "
+                        f"{stats['duplicate_facts']} repeated facts, {stats['duplicate_urls']} repeated URLs, "
+                        f"{stats['dropped_for_budget']} low-priority facts trimmed)"
+                    )
                 
                 with st.expander("📊 View Script Architecture Details", expanded=False):
                     st.markdown("#### 🌍 Thematic Resonance")
@@ -408,19 +485,93 @@ with tab3:
                         for char in p.get('character_matrix', []):
                             st.markdown(f"**{char['name']}** <span class='metric-badge'>{char['arc_score']}/10</span>", unsafe_allow_html=True)
 
+                with st.expander("🎯 Regenerate a Single Section", expanded=False):
+                    st.caption("Rewrites one section using only its neighbours as context. Everything else in the package is kept as is, and edits in the editor below are replaced by the new script.")
+                    section_labels = dict(EDITABLE_SECTIONS)
+                    regen_section = st.selectbox("Section:", [key for key, _ in EDITABLE_SECTIONS], format_func=section_labels.get)
+                    regen_direction = st.text_input("Direction (optional):", placeholder="e.g. Make it punchier and end on a question.")
+                    if st.button(f"🔁 Regenerate {section_labels[regen_section]}"):
+                        with st.spinner(f"Rewriting the {section_labels[regen_section]}..."):
+                            started = time.perf_counter()
+                            new_text = regenerate_script_section(
+                                mode=st.session_state['mode_param'],
+                                topic=st.session_state['topic_param'],
+                                package=p,
+                                section=regen_section,
+                                angle=st.session_state['angle_param'],
+                                matrix=st.session_state['matrix_param'],
+                                source_type=st.session_state['source_param'],
+                                length=st.session_state['length_param'],
+                                api_key=api_key,
+                                direction=regen_direction
+                            )
+                        if new_text.startswith("Error:"):
+                            st.error(new_text)
+                        else:
+                            p = splice_script_section(p, regen_section, new_text)
+                            st.session_state['package'] = p
+                            st.session_state['package_at'] = time.time()
+                            st.session_state['section_regen'] = (
+                                section_labels[regen_section], time.perf_counter() - started,
+                                estimate_tokens(new_text), estimate_tokens(json.dumps(p, ensure_ascii=False))
+                            )
+                    if 'section_regen' in st.session_state:
+                        label, elapsed, section_tokens, package_tokens = st.session_state['section_regen']
+                        st.caption(f"⏱️ {label} rewritten in {elapsed:.1f}s · ~{section_tokens:,} output tokens vs ~{package_tokens:,} for a full package")
+
+                with st.expander("🧪 Title, Hook & Thumbnail Variants", expanded='packaging_variants' in st.session_state):
+                    st.caption("One request returns several candidates for each field. Switching between them is instant; nothing is sent again until you ask for new variants.")
+                    variant_count = st.slider("Candidates per field", 2, 6, DEFAULT_VARIANT_COUNT)
+                    if st.button(f"🎲 Generate {variant_count} Variants of Each"):
+                        with st.spinner("Writing alternative titles, hooks and thumbnail prompts..."):
+                            started = time.perf_counter()
+                            bundle = st.session_state.get('yt_bundle', {})
+                            variants = generate_packaging_variants(
+                                topic=st.session_state['topic_param'],
+                                angle=st.session_state['angle_param'],
+                                matrix=st.session_state['matrix_param'],
+                                length=st.session_state['length_param'],
+                                script_text=st.session_state.get('final_script_text') or assemble_script_text(p),
+                                api_key=api_key,
+                                current={'viral_title': p.get('viral_title'), 'hook_script': p.get('hook_script'),
+                                         'thumbnail_prompt': bundle.get('thumbnail_prompt')},
+                                count=variant_count
+                            )
+                        if "error" in variants:
+                            st.error(variants['error'])
+                        else:
+                            st.session_state['packaging_variants'] = variants
+                            st.session_state['packaging_variants_s'] = time.perf_counter() - started
+                    if 'packaging_variants' in st.session_state:
+                        variants = st.session_state['packaging_variants']
+                        st.caption(f"⏱️ {sum(len(variants[key]) for key, _ in VARIANT_FIELDS)} candidates in {st.session_state['packaging_variants_s']:.1f}s from a single request")
+                        if variants.get('unresolved'):
+                            st.warning(f"⚠️ No new candidates for: {', '.join(variants['unresolved'])}. Only the current version is offered.")
+                        picks = {key: st.radio(f"**{label}:**", variants[key], key=f"variant_pick_{key}") for key, label in VARIANT_FIELDS}
+                        if st.button("✅ Use These Picks"):
+                            p = splice_script_section(p, "hook", picks['hook_script'])
+                            p['viral_title'] = picks['viral_title']
+                            st.session_state['package'] = p
+                            st.session_state['package_at'] = time.time()
+                            # The bundle tab shows the picked title and thumbnail prompt over its own.
+                            st.session_state['variant_picks'] = {key: picks[key] for key in ('viral_title', 'thumbnail_prompt')}
+                            st.rerun()
+
                 st.markdown("### 📝 Conversational Script Editor")
                 st.info("💡 Edit the text below exactly as you want it spoken. Add commas or dashes (---) to force natural pauses for the voiceover. Your edits are automatically saved.")
                 
-                full_script = p.get('full_script', {})
-                
-                default_script_text = f"{p.get('hook_script', '')}\n\n"
-                default_script_text += f"{full_script.get('intro', '')}\n\n"
-                default_script_text += f"{full_script.get('act1', '')}\n\n"
-                default_script_text += f"{full_script.get('act2', '')}\n\n"
-                default_script_text += f"{full_script.get('act3', '')}\n\n"
-                default_script_text += f"{full_script.get('outro', '')}"
+                default_script_text = assemble_script_text(p)
                 
-                st.session_state['final_script_text'] = st.text_area("Final Polish:", value=default_script_text.strip(), height=400)
+                publish('final_script_text', st.text_area("Final Polish:", value=default_script_text, height=400))
+                # Only a freshly generated script starts the bundle and voiceover early. Polish edits, section
+                # regeneration and picked variants wait for the buttons, so they don't spend quota on every change.
+                if st.session_state.pop('speculate_bundle', False) and speculative and api_key and st.session_state['final_script_text'].strip():
+                    schedule_bundle_and_voiceover(
+                        api_key,
+                        st.session_state['final_script_text'],
+                        st.session_state.get('voice_option', VOICES[0])[0],
+                        st.session_state.get('tts_concurrency', TTS_DEFAULT_CONCURRENCY)
+                    )
                 
                 st.download_button(
                     label="📥 Download Text Script",
@@ -432,25 +583,25 @@ with tab3:
                 st.success("🎉 **Step 3 Complete!** Once you are happy with the pacing, click the **'4. Voiceover'** tab.")
 
 # --- TAB 4: GENERATE VOICEOVER ---
-with tab4:
+def render_voiceover(audio, key=None):
+    st.audio(audio, format='audio/mp3')
+    st.download_button(
+        label="📥 Download Audio File (.mp3)",
+        data=audio,
+        file_name="professional_voiceover.mp3",
+        mime="audio/mp3",
+        key=key
+    )
+
+@isolated
+def voiceover_tab():
     st.subheader("Step 4: AI Voiceover Studio")
     st.info("Turn your finalized script or a custom uploaded file into professional audio.")
 
     st.markdown("### 🎙️ Voice Settings")
-    voice_option = st.selectbox("Select Narrator (US English)", [
-        ("en-US-ChristopherNeural", "Christopher (Male - Deep/Professional)"),
-        ("en-US-GuyNeural", "Guy (Male - Natural/Conversational)"),
-        ("en-US-EricNeural", "Eric (Male - Casual)"),
-        ("en-US-RogerNeural", "Roger (Male - Confident)"),
-        ("en-US-SteffanNeural", "Steffan (Male - Expressive)"),
-        ("en-US-AndrewNeural", "Andrew (Male - Warm)"),
-        ("en-US-BrianNeural", "Brian (Male - Crisp/News)"),
-        ("en-US-AriaNeural", "Aria (Female - Clear)"),
-        ("en-US-JennyNeural", "Jenny (Female - Conversational)"),
-        ("en-US-MichelleNeural", "Michelle (Female - Bright)"),
-        ("en-US-EmmaNeural", "Emma (Female - Friendly)"),
-        ("en-US-AvaNeural", "Ava (Female - Engaging)")
-    ], format_func=lambda x: x[1])
+    voice_option = st.selectbox("Select Narrator (US English)", VOICES, format_func=lambda x: x[1], key='voice_option')
+    tts_concurrency = st.slider("Parallel Synthesis Streams", 1, 8, min(max(TTS_DEFAULT_CONCURRENCY, 1), 8), key='tts_concurrency',
+                                help="The script is split into paragraph/sentence chunks that are voiced concurrently and stitched back in order.")
 
     st.markdown("---")
 
@@ -473,32 +624,69 @@ with tab4:
     
     st.session_state['tab4_audio_text'] = st.text_area("This exact text will be sent to the AI Voice:", value=text_to_synthesize, height=250)
 
+    voiceover_run = get_scheduler().get("voiceover")
+    if (voiceover_run is not None and voiceover_run.state == "done"
+            and voiceover_run.inputs == {"text": st.session_state['tab4_audio_text'], "voice": voice_option[0]}):
+        background_audio = get_audio_spill().read(voiceover_run.result)
+        if background_audio is not None:
+            st.success("⚡ A voiceover for this exact text was pre-generated in the background.")
+            render_voiceover(background_audio, key="download_background_voiceover")
+
     if st.button("🔊 Generate Voiceover"):
         if not st.session_state['tab4_audio_text'].strip():
             st.error("Text box is empty. Please provide text to generate audio.")
         else:
-            with st.spinner(f"Synthesizing audio with {voice_option[1]} (this may take 10-20 seconds)..."):
+            with st.spinner(f"Synthesizing audio with {voice_option[1]}..."):
                 selected_voice = voice_option[0] 
-                audio_file_path = generate_audio_sync(st.session_state['tab4_audio_text'], selected_voice)
+                progress_bar = st.progress(0.0, text="Checking paragraph cache...")
+
+                def report_chunk_progress(done, total):
+                    progress_bar.progress(done / total, text=f"Synthesized chunk {done} of {total}")
+
+                tts_cache = get_tts_cache()
+                cache_before = tts_cache.stats()
+                try:
+                    audio = generate_audio_sync(
+                        st.session_state['tab4_audio_text'],
+                        selected_voice,
+                        max_concurrency=tts_concurrency,
+                        on_progress=report_chunk_progress,
+                        cache=tts_cache
+                    )
+                except Exception as e:
+                    st.error(f"Audio Generation Error: {e}")
+                    audio = None
+                cache_after = tts_cache.stats()
+                progress_bar.empty()
                 
-                if audio_file_path:
+                if audio:
+                    spill = get_audio_spill()
+                    spill.release(st.session_state.get('voiceover_audio'))
+                    st.session_state['voiceover_audio'] = spill.hold(audio)
                     st.success("✅ Audio generated successfully!")
-                    st.audio(audio_file_path, format='audio/mp3')
-                    
-                    with open(audio_file_path, "rb") as file:
-                        st.download_button(
-                            label="📥 Download Audio File (.mp3)",
-                            data=file,
-                            file_name="professional_voiceover.mp3",
-                            mime="audio/mp3"
-                        )
+                    reused = cache_after['hits'] - cache_before['hits']
+                    synthesized = cache_after['misses'] - cache_before['misses']
+                    st.caption(
+                        f"♻️ Reused {reused} of {reused + synthesized} paragraphs from the voiceover cache "
+                        f"(~{cache_after['seconds_saved'] - cache_before['seconds_saved']:.1f}s of synthesis saved). "
+                        f"Server totals: {cache_after['hits']} hits / {cache_after['misses']} misses, "
+                        f"{cache_after['entries']} paragraphs, {cache_after['bytes'] / (1024 * 1024):.1f} MB."
+                    )
                 else:
                     st.error("Failed to generate audio. Please check your internet connection and try again.")
-            
+
+    if 'voiceover_audio' in st.session_state:
+        # The player and the download share one in-memory copy of the audio.
+        audio = get_audio_spill().read(st.session_state['voiceover_audio'])
+        if audio is None:
+            st.warning("This voiceover was cleared from temporary storage. Please generate it again.")
+        else:
+            render_voiceover(audio)
             st.success("🎉 **Step 4 Complete!** Ready to finalize? Click the **'5. Content Bundle'** tab to generate your SEO metadata and thumbnail prompt.")
 
 # --- TAB 5: CONTENT BUNDLE ---
-with tab5:
+@isolated
+def bundle_tab(api_key, refresh_cache):
     st.subheader("Step 5: YouTube Content Bundle")
     st.info("Package your final script with a viral title, SEO description, tags, and a thumbnail concept.")
     
@@ -518,7 +706,8 @@ with tab5:
             st.error("⚠️ Target text is empty. Please ensure you have generated or uploaded a script in the previous tabs.")
         else:
             with st.spinner("Analyzing script and generating YouTube metadata..."):
-                st.session_state['yt_bundle'] = generate_youtube_bundle(api_key, target_text)
+                st.session_state['yt_bundle'] = generate_youtube_bundle(api_key, target_text, refresh_cache=refresh_cache)
+                st.session_state['yt_bundle_at'] = time.time()
                 
     if 'yt_bundle' in st.session_state:
         bundle = st.session_state['yt_bundle']
@@ -526,6 +715,11 @@ with tab5:
             st.error(bundle['error'])
         else:
             st.success("✅ YouTube Bundle Generated!")
+            if bundle.get('unresolved'):
+                st.warning(f"⚠️ Still invalid after a targeted retry, left empty: {', '.join(bundle['unresolved'])}")
+            if 'variant_picks' in st.session_state:
+                bundle = dict(bundle, **st.session_state['variant_picks'])
+                st.caption("🧪 Showing the title and thumbnail prompt you picked from the variants in Step 3.")
             
             # Text Metadata Section
             st.markdown("### 📝 YouTube Metadata")
@@ -545,5 +739,25 @@ with tab5:
             
             st.text_area("Suggested Image Prompt:", value=bundle.get('thumbnail_prompt', ''), height=100)
 
+# --- 5 LINEAR WORKFLOW TABS ---
+tab1, tab2, tab3, tab4, tab5 = st.tabs([
+    "1. Parameters", 
+    "2. Ground Research", 
+    "3. Generated Script", 
+    "4. Voiceover",
+    "5. Content Bundle"
+])
+
+with tab1:
+    parameters_tab(api_key, speculative)
+with tab2:
+    research_tab(api_key, refresh_cache)
+with tab3:
+    script_tab(api_key, refresh_cache, speculative)
+with tab4:
+    voiceover_tab()
+with tab5:
+    bundle_tab(api_key, refresh_cache)
+
 st.divider()
 st.caption("Script Architect Pro v6.0 | Parameter-Driven Research Architecture")
@@ -0,0 +1 @@
+"""Offline benchmarks for Script Architect Pro. Run them from the repository root with ``python -m benchmarks.<name>``."""
@@ -0,0 +1,124 @@
+"""Measures the per-call overhead GeminiClient saves against a local stub server.
+
+Compares a bare ``requests.post`` per call (a fresh TCP/TLS connection every time,
+as call_gemini used to do) with the client's pooled keep-alive session on the
+shared runtime, and, when the SDK is installed, ``genai.configure`` +
+``GenerativeModel(...)`` per call with the memoized model lookup.
+
+    python -m benchmarks.client_overhead --calls 300
+    python -m benchmarks.client_overhead --certfile cert.pem --keyfile key.pem  # include TLS handshakes
+"""
+
+import argparse
+import statistics
+import time
+
+import requests
+import urllib3
+
+from benchmarks.stub_gemini import StubGeminiServer
+from script_architect.gemini import GEMINI_MODEL, GeminiClient, search_payload
+from script_architect.runtime import get_runtime
+
+API_KEY = "benchmark-key"
+
+
+def measure(fn, calls):
+    fn()  # warm-up
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def summarize(label, samples):
+    ordered = sorted(samples)
+    return {
+        "label": label,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+    }
+
+
+def print_pair(title, before, after):
+    print(f"\n{title}")
+    for row in (before, after):
+        print(f"  {row['label']:<28} mean {row['mean_ms']:8.3f} ms   p50 {row['p50_ms']:8.3f} ms   p95 {row['p95_ms']:8.3f} ms")
+    print(f"  {'saved per call':<28} mean {before['mean_ms'] - after['mean_ms']:8.3f} ms")
+
+
+def bench_rest(server, calls, verify):
+    client = GeminiClient(API_KEY, api_base=server.base_url)
+    client.verify = verify
+    runtime = get_runtime()
+    url = client.rest_url("generateContent")
+    payload = search_payload("benchmark prompt", "benchmark instruction")
+    headers = {"Content-Type": "application/json", "x-goog-api-key": API_KEY}
+
+    def fresh_connection():
+        requests.post(url, headers=headers, json=payload, timeout=10, verify=verify).json()
+
+    def pooled_connection():
+        runtime.run(client.post_json("generateContent", payload))
+
+    before = summarize("fresh connection per call", measure(fresh_connection, calls))
+    after = summarize("pooled keep-alive session", measure(pooled_connection, calls))
+    runtime.run(client.aclose())
+    return before, after
+
+
+def bench_models(calls):
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        return None
+    client = GeminiClient(API_KEY)
+    instruction = "You are a master YouTube strategist and SEO expert."
+
+    def rebuild_model():
+        genai.configure(api_key=API_KEY)
+        genai.GenerativeModel(
+            model_name=GEMINI_MODEL,
+            system_instruction=instruction,
+            generation_config={"response_mime_type": "application/json"}
+        )
+
+    def memoized_model():
+        client.model(instruction, is_json=True)
+
+    async def first_model():
+        # The async transport binds to the runtime loop, so the first model is built there.
+        client.model(instruction, is_json=True)
+
+    get_runtime().run(first_model())
+
+    before = summarize("configure + new model", measure(rebuild_model, calls))
+    after = summarize("memoized model", measure(memoized_model, calls))
+    return before, after
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--certfile", help="Serve the stub over TLS with this certificate (PEM).")
+    parser.add_argument("--keyfile", help="Private key for --certfile.")
+    args = parser.parse_args()
+
+    if args.certfile:
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    with StubGeminiServer(certfile=args.certfile, keyfile=args.keyfile) as server:
+        print(f"Stub endpoint: {server.base_url} ({args.calls} calls per variant)")
+        print_pair("REST generateContent", *bench_rest(server, args.calls, verify=False))
+
+    models = bench_models(args.calls)
+    if models:
+        print_pair("SDK model setup", *models)
+    else:
+        print("\nSDK model setup: skipped (google-generativeai is not installed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Replays a corpus of broken model outputs through the tolerant JSON parser.
+
+For every file in benchmarks/json_repair_corpus/ (``script_*`` files use the
+script package schema, ``bundle_*`` files the bundle schema) it compares the
+old strip-fences-and-json.loads path with repair_json + schema validation, and
+counts how many full regenerations become local repairs or small targeted
+follow-ups. Each output is also fed in small pieces through the
+IncrementalJSONParser the streamed UI path uses; the run exits with status 1 if
+that parser raises on any of them.
+
+    python -m benchmarks.json_repair
+"""
+
+import json
+import os
+import sys
+
+from script_architect.condense import estimate_tokens
+from script_architect.json_repair import repair_json, schema_template, validate
+from script_architect.jsonstream import IncrementalJSONParser
+from script_architect.pipeline import BUNDLE_SCHEMA, SCRIPT_PACKAGE_SCHEMA
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "json_repair_corpus")
+# Roughly the size of a streamed response delta.
+STREAM_PIECE_CHARS = 16
+
+
+def legacy_parse(text):
+    try:
+        json.loads(text.replace("```json", "").replace("```", "").strip())
+        return True
+    except ValueError:
+        return False
+
+
+def stream_parse(text):
+    """Number of fields the streaming parser completes, or the exception it raised."""
+    parser = IncrementalJSONParser()
+    try:
+        for start in range(0, len(text), STREAM_PIECE_CHARS):
+            parser.feed(text[start:start + STREAM_PIECE_CHARS])
+    except Exception as e:
+        return e
+    return len(parser.values)
+
+
+def main():
+    rows = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        with open(os.path.join(CORPUS_DIR, name), encoding="utf-8") as f:
+            text = f.read()
+        schema = BUNDLE_SCHEMA if name.startswith("bundle_") else SCRIPT_PACKAGE_SCHEMA
+        obj, method = repair_json(text)
+        fields = validate(obj, schema) if obj is not None else None
+        if obj is None:
+            outcome = "full regeneration"
+        elif fields:
+            outcome = "targeted follow-up"
+        else:
+            outcome = "repaired locally"
+        follow_up_tokens = estimate_tokens(json.dumps(schema_template(schema, fields))) if fields else 0
+        rows.append({
+            "file": name,
+            "legacy_ok": legacy_parse(text),
+            "method": method,
+            "outcome": outcome,
+            "fields": fields or [],
+            "follow_up_schema_tokens": follow_up_tokens,
+            "stream": stream_parse(text),
+        })
+
+    print(f"{'file':<42} {'legacy':<8} {'method':<10} {'stream':<8} {'outcome':<20} re-requested fields")
+    for row in rows:
+        stream = "CRASH" if isinstance(row["stream"], Exception) else f"{row['stream']} flds"
+        print(f"{row['file']:<42} {'ok' if row['legacy_ok'] else 'FAIL':<8} {row['method']:<10} {stream:<8} "
+              f"{row['outcome']:<20} {', '.join(row['fields']) or '-'}")
+
+    legacy_regenerations = sum(not row["legacy_ok"] for row in rows)
+    regenerations = sum(row["outcome"] == "full regeneration" for row in rows)
+    targeted = sum(row["outcome"] == "targeted follow-up" for row in rows)
+    print(f"\n{len(rows)} outputs: legacy parser needs {legacy_regenerations} full regenerations, "
+          f"tolerant parser needs {regenerations} (+{targeted} targeted follow-ups for "
+          f"{sum(len(row['fields']) for row in rows)} fields).")
+    print(f"Full regenerations avoided: {legacy_regenerations - regenerations} of {legacy_regenerations}.")
+    crashes = [row for row in rows if isinstance(row["stream"], Exception)]
+    for row in crashes:
+        print(f"Streaming parser raised on {row['file']}: {row['stream']!r}")
+    return 1 if crashes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""Drives the real pipeline against local Gemini and Edge-TTS stand-ins under single and concurrent load.
+
+Two loads run back to back:
+
+    single      one topic at a time through the path the UI takes (streamed
+                research and script, voiceover, bundle), --runs times
+    concurrent  --topics topics through the batch runner with --workers workers
+
+The stub Gemini endpoint can add latency, 5xx errors, 429s and malformed JSON;
+the Edge-TTS stand-in adds per-character latency and dropped connections. Stage
+p50/p95 come from the pipeline's own tracing spans. Uncached prompt tokens add
+prefill time; as with Gemini's implicit caching, a prompt that starts like a
+recent one gets that shared start cached, so the token counts show what the
+stable prompt prefixes save. --save writes the results as JSON, and --baseline
+compares them with an earlier file and exits with status 1 when a metric got
+worse by more than --tolerance.
+
+    python -m benchmarks.pipeline_load --topics 12 --workers 4 --save before.json
+    python -m benchmarks.pipeline_load --rate-limit-rate 0.05 --malformed-rate 0.2 --baseline before.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stub_gemini import StubGeminiServer, request_text, wants_json
+from benchmarks.stub_tts import StubTTS
+
+API_KEY = "benchmark-key"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOPICS = ["Blade Runner 2049", "The Right to Repair", "Rust in the Linux Kernel", "Arrival", "The Fediverse", "Dune Part Two"]
+RETRY_COUNTERS = ["gemini_retries", "gemini_rate_limited", "tts_chunk_retries"]
+# (metric path, True when higher is better) compared against a baseline, per scenario.
+COMPARED_METRICS = [
+    (("throughput_per_min",), True),
+    (("latency_s", "p50"), False),
+    (("latency_s", "p95"), False),
+    (("tokens", "uncached_prompt"), False),
+]
+# Latencies must also worsen by this much to count, so sub-millisecond stages do not flag noise.
+NOISE_FLOOR_S = 0.01
+
+
+def fake_reply(payload):
+    """Plausible model output for each kind of pipeline request, mentioning the request's topic."""
+    prompt, instruction = request_text(payload)
+    match = re.search(r"TOPIC: (.+)", prompt)
+    topic = match.group(1).strip() if match else "this story"
+    slug = re.sub(r"[^a-z0-9]+", "-", topic.lower()).strip("-")
+
+    if wants_json(payload):
+        if "packaging bundle" in prompt:
+            return json.dumps({
+                "viral_title": f"Nobody Talks About This Part of {topic}",
+                "description": f"What {topic} really tells us, and why it matters now. " * 4,
+                "tags": [f"{topic} tag {n}" for n in range(15)],
+                "hashtags": ["#video", "#essay", "#analysis"],
+                "thumbnail_prompt": f"High-contrast close-up for {topic}, rim lighting, bold colors, one shocked face.",
+            })
+        section = f"Let's talk about {topic}. " + "Here is a sentence that sounds like a real person talking. " * 10
+        return json.dumps({
+            "thematic_resonance": {"real_world_event": f"{topic} in the news", "explanation": "A real parallel."},
+            "character_matrix": [{"name": "Lead", "role": "Main", "arc_score": 8, "ghost_vs_truth": "Wants vs needs."}],
+            "technical_report": {"script": 8, "direction": 9, "editing": 7, "acting": 8},
+            "viral_title": f"The Truth About {topic}",
+            "hook_script": f"You think you know {topic}? You don't.",
+            "full_script": {key: f"{section}({key})" for key in ("intro", "act1", "act2", "act3", "outro")},
+            "script_outline": ["Setup", "Turn", "Payoff"],
+            "seo_metadata": {"description": f"A deep look at {topic}.", "tags": [topic, "analysis"]},
+        })
+    if "tools" in payload:
+        return "\n".join(
+            f"- Fact {n} about {topic}: it happened on 20{10 + n}-0{1 + n % 9}-1{n % 10} and drew {n * 7} million views "
+            f"(https://example.com/{slug}/{n})"
+            for n in range(12)
+        )
+    return f"A fresh take on this part of {topic}. " * 6
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {"p50": None, "p95": None, "max": None}
+    return {
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def counter_total(counters, name):
+    return sum(value for key, value in counters.items() if key == name or key.startswith(name + "{"))
+
+
+def rows_for(count, prefix, lengths):
+    return [
+        {
+            "topic": f"{prefix} {TOPICS[index % len(TOPICS)]} #{index}",
+            "angle": "Why this matters more than people think.",
+            "length": lengths[index % len(lengths)],
+        }
+        for index in range(count)
+    ]
+
+
+def run_interactive(row, voice):
+    """One topic through the UI's path; returns True when every stage produced a usable result."""
+    from script_architect import pipeline, tts
+
+    research = pipeline.perform_grounded_research(
+        row["topic"], row["mode"], row["source_type"], row["angle"], row["length"], API_KEY, on_chunk=lambda delta: None
+    )
+    if research.startswith("Error:"):
+        return False
+    condensed, _ = pipeline.condense_research_for_script(
+        row["topic"], research, row["angle"], row["matrix"], row["source_type"], row["length"]
+    )
+    package = pipeline.generate_script_package(
+        row["mode"], row["topic"], condensed, row["angle"], row["matrix"], row["source_type"], row["length"], API_KEY,
+        on_field=lambda path, value: None
+    )
+    if "error" in package:
+        return False
+    script_text = pipeline.assemble_script_text(package)
+    try:
+        tts.generate_audio_sync(script_text, voice, cache=tts.get_tts_cache())
+    except Exception:
+        return False
+    return "error" not in pipeline.generate_youtube_bundle(API_KEY, script_text)
+
+
+def measure_scenario(server, tts_stub, run):
+    """Runs run() -> (topic_latencies, completed) and gathers everything the pipeline and stubs recorded."""
+    from script_architect.telemetry import get_telemetry
+
+    telemetry = get_telemetry()
+    telemetry.reset()
+    server_before, tts_before = dict(server.stats), dict(tts_stub.stats)
+    started = time.perf_counter()
+    latencies, completed = run()
+    wall = time.perf_counter() - started
+
+    counters = telemetry.counters()
+    prompt_tokens = counters.get("gemini_tokens{kind=prompt}", 0)
+    cached_tokens = counters.get("gemini_tokens{kind=cached}", 0)
+    rerequests = sum(
+        1 for span in list(telemetry.recent)
+        if span.name in ("script", "bundle") and span.attrs.get("rerequested_fields")
+    )
+    return {
+        "topics": len(latencies),
+        "completed": completed,
+        "failed": len(latencies) - completed,
+        "wall_s": wall,
+        "throughput_per_min": completed / wall * 60 if wall else 0.0,
+        "latency_s": percentiles(latencies),
+        "stages": {
+            name: {key: stats[key] for key in ("count", "errors", "p50_s", "p95_s", "max_s")}
+            for name, stats in telemetry.stage_stats().items()
+        },
+        "tokens": {"prompt": prompt_tokens, "cached": cached_tokens, "uncached_prompt": prompt_tokens - cached_tokens,
+                   "response": counters.get("gemini_tokens{kind=response}", 0)},
+        "retries": dict({name: counter_total(counters, name) for name in RETRY_COUNTERS}, json_rerequests=rerequests),
+        "gemini_server": {key: server.stats[key] - server_before[key] for key in server.stats},
+        "tts_server": {key: tts_stub.stats[key] - tts_before[key] for key in tts_stub.stats},
+    }
+
+
+def bench_single(runs, voice, lengths):
+    from script_architect.batch import DEFAULT_ROW
+
+    def run():
+        latencies, completed = [], 0
+        for row in rows_for(runs, "single", lengths):
+            row = dict(DEFAULT_ROW, matrix=str(DEFAULT_ROW["matrix"]), **row)
+            started = time.perf_counter()
+            completed += run_interactive(row, voice)
+            latencies.append(time.perf_counter() - started)
+        return latencies, completed
+    return run
+
+
+def bench_concurrent(topics, workers, voice, workdir, lengths):
+    from script_architect import batch
+    from script_architect.telemetry import get_telemetry
+
+    def run():
+        rows_path = os.path.join(workdir, "topics.jsonl")
+        with open(rows_path, "w", encoding="utf-8") as f:
+            for row in rows_for(topics, "concurrent", lengths):
+                f.write(json.dumps(row) + "\n")
+        results = batch.run_batch(batch.load_rows(rows_path), os.path.join(workdir, "batch"), API_KEY,
+                                  workers=workers, voice=voice)
+        latencies = [span.duration for span in list(get_telemetry().recent) if span.name == "batch.row"]
+        return latencies, sum(status["state"] == "complete" for status in results)
+    return run
+
+
+def print_scenario(name, result):
+    latency = result["latency_s"]
+    print(f"\n{name}: {result['completed']}/{result['topics']} topics in {result['wall_s']:.1f}s "
+          f"-> {result['throughput_per_min']:.1f} topics/min; per topic p50 {latency['p50'] or 0:.2f}s, "
+          f"p95 {latency['p95'] or 0:.2f}s")
+    print(f"  {'stage':<16} {'count':>6} {'errors':>6} {'p50 s':>8} {'p95 s':>8} {'max s':>8}")
+    for stage, stats in sorted(result["stages"].items(), key=lambda item: -item[1]["p95_s"]):
+        print(f"  {stage:<16} {stats['count']:>6} {stats['errors']:>6} {stats['p50_s']:>8.2f} "
+              f"{stats['p95_s']:>8.2f} {stats['max_s']:>8.2f}")
+    print("  tokens: " + ", ".join(f"{key} {value}" for key, value in result["tokens"].items()))
+    print("  retries: " + ", ".join(f"{key} {value}" for key, value in result["retries"].items()))
+    print("  gemini stub: " + ", ".join(f"{key} {value}" for key, value in result["gemini_server"].items()))
+    print("  tts stub: " + ", ".join(f"{key} {value}" for key, value in result["tts_server"].items()))
+
+
+def compare(results, baseline, tolerance):
+    """Prints current vs baseline for the headline metrics and every stage's p95; returns the regressions."""
+    if baseline.get("config") != results["config"]:
+        print("\nNote: the baseline was recorded with a different configuration; differences may not be regressions.")
+    print(f"\nCompared with baseline {baseline.get('revision') or '?'} ({baseline.get('recorded_at', '?')}):")
+    regressions = []
+    for scenario, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(scenario)
+        if not previous:
+            continue
+        metrics = list(COMPARED_METRICS) + [(("stages", stage, "p95_s"), False) for stage in current["stages"]]
+        for path, higher_is_better in metrics:
+            before, after = previous, current
+            for key in path:
+                before = before.get(key) if isinstance(before, dict) else None
+                after = after.get(key) if isinstance(after, dict) else None
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            noise = not higher_is_better and after - before < NOISE_FLOOR_S
+            flag = "REGRESSED" if worse > tolerance and not noise else ""
+            if flag:
+                regressions.append((scenario, ".".join(path), before, after))
+            print(f"  {scenario + '.' + '.'.join(path):<44} {before:>10.3f} -> {after:>10.3f}  {change:+7.1%}  {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Topics run one after another in the single scenario")
+    parser.add_argument("--topics", type=int, default=8, help="Topics in the concurrent scenario")
+    parser.add_argument("--workers", type=int, default=4, help="Batch workers in the concurrent scenario")
+    parser.add_argument("--length", choices=["mixed", "short", "mid", "deep"], default="mixed",
+                        help="Video length of the topics; mixed cycles through all three (deep dives fan out research)")
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub Gemini latency per request, seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform +/- jitter on that latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of Gemini requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Share of Gemini requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=0.5, help="retryDelay the stub puts in its 429s, seconds")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of JSON replies that come back broken")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=20.0,
+                        help="Stub Gemini time per thousand uncached prompt tokens before the first byte, ms")
+    parser.add_argument("--tts-latency", type=float, default=0.05, help="Stub Edge-TTS latency per chunk, seconds")
+    parser.add_argument("--tts-failure-rate", type=float, default=0.0, help="Share of TTS chunks whose stream drops")
+    parser.add_argument("--rpm", type=float, default=0, help="GEMINI_RPM for the run (0 disables the limiter's request bucket)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--baseline", help="Compare with results saved by an earlier --save")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative worsening reported as a regression")
+    args = parser.parse_args()
+
+    config = {key: value for key, value in vars(args).items() if key not in ("save", "baseline", "tolerance")}
+
+    with tempfile.TemporaryDirectory(prefix="pipeline_load_") as workdir, StubGeminiServer(
+        reply=fake_reply, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, malformed_rate=args.malformed_rate, retry_after=args.retry_after,
+        seed=args.seed, prefill_seconds_per_1k=args.prefill_ms_per_1k / 1000
+    ) as server:
+        tts_stub = StubTTS(latency=args.tts_latency, failure_rate=args.tts_failure_rate, seed=args.seed).install()
+        # Gemini, cache and limiter settings are read when those modules are first imported,
+        # so they are set before anything below imports them.
+        os.environ.update({
+            "GEMINI_API_BASE": server.base_url,
+            "GEMINI_TRANSPORT": "rest",
+            "GEMINI_RPM": str(args.rpm),
+            "LLM_CACHE": "0",
+            "TTS_CACHE_PATH": os.path.join(workdir, "tts_cache.sqlite3"),
+            "KNOWLEDGE_INDEX_PATH": os.path.join(workdir, "knowledge.sqlite3"),
+        })
+        from script_architect.pipeline import VIDEO_LENGTHS
+        from script_architect.tts import VOICES
+        voice = VOICES[0][0]
+        lengths = {"mixed": VIDEO_LENGTHS, "short": VIDEO_LENGTHS[:1], "mid": VIDEO_LENGTHS[1:2], "deep": VIDEO_LENGTHS[2:]}[args.length]
+        print(f"Stub endpoint: {server.base_url} (latency {args.latency}s ± {args.jitter}s, 500s {args.error_rate:.0%}, "
+              f"429s {args.rate_limit_rate:.0%}, malformed JSON {args.malformed_rate:.0%})")
+
+        results = {
+            "revision": git_revision(),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "config": config,
+            "scenarios": {},
+        }
+        for name, run in (
+            ("single", bench_single(args.runs, voice, lengths)),
+            ("concurrent", bench_concurrent(args.topics, args.workers, voice, workdir, lengths)),
+        ):
+            results["scenarios"][name] = measure_scenario(server, tts_stub, run)
+            print_scenario(name, results["scenarios"][name])
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.save}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.tolerance:.0%}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
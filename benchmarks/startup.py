@@ -0,0 +1,120 @@
+"""Tracks the app's cold start and the cost of each rerun.
+
+Import timings run in fresh interpreters, so every sample is a real cold
+import: the pipeline modules the app loads at startup, and the SDKs they now
+defer to first use. Rerun timings drive app.py with Streamlit's AppTest
+harness and report the script execution time of the first run, a plain rerun
+and a widget interaction inside the parameters tab. Every fragment body is
+counted as it executes, so the interaction's row shows which tabs actually
+reran: only parameters_tab if the fragment isolated it, every tab if the
+whole script ran again (as it does on AppTest versions without fragment
+support).
+
+    python -m benchmarks.startup --samples 5
+"""
+
+import argparse
+import collections
+import contextlib
+import functools
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_MODULES = ["script_architect.pipeline", "script_architect.tts", "script_architect.scheduler"]
+LAZY_SDKS = ["google.generativeai", "edge_tts", "aiohttp"]
+
+
+def import_seconds(module):
+    """Cold import time of module in a fresh interpreter, or None if it is not installed."""
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def bench_imports(samples):
+    print("Cold imports (median of fresh interpreters)")
+    for label, modules in (("loaded at startup", APP_MODULES), ("deferred to first use", LAZY_SDKS)):
+        for module in modules:
+            timings = [import_seconds(module) for _ in range(samples)]
+            if None in timings:
+                print(f"  {module:<28} not installed ({label})")
+                continue
+            print(f"  {module:<28} {statistics.median(timings) * 1000:8.1f} ms  ({label})")
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return time.perf_counter() - started
+
+
+@contextlib.contextmanager
+def counted_fragments(counts):
+    """Wraps st.fragment so each execution of a fragment body adds one to counts[name]."""
+    import streamlit as st
+
+    fragment = getattr(st, "fragment", None)
+    if fragment is None:
+        yield
+        return
+
+    def counting(func=None, **kwargs):
+        def wrap(body):
+            @functools.wraps(body)
+            def counted(*args, **kw):
+                counts[body.__name__] += 1
+                return body(*args, **kw)
+            return fragment(counted, **kwargs)
+        return wrap if func is None else wrap(func)
+
+    st.fragment = counting
+    try:
+        yield
+    finally:
+        st.fragment = fragment
+
+
+def bench_reruns(samples):
+    from streamlit.testing.v1 import AppTest
+
+    phases = ("first run", "plain rerun", "widget interaction")
+    timings = {phase: [] for phase in phases}
+    executed = {phase: collections.Counter() for phase in phases}
+    counts = collections.Counter()
+
+    def measure(phase, fn):
+        counts.clear()
+        timings[phase].append(timed(fn))
+        executed[phase].update(counts)
+
+    with counted_fragments(counts):
+        for _ in range(samples):
+            app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+            measure("first run", app.run)
+            measure("plain rerun", app.run)
+            # "Content Mode" lives in the parameters tab and publishes nothing until it is saved.
+            mode = app.selectbox[0]
+            measure("widget interaction", lambda: mode.set_value(mode.options[1]).run())
+
+    print("\nScript execution per run (median) and fragment bodies executed per run")
+    for phase in phases:
+        ran = ", ".join(f"{name} x{total / samples:g}" for name, total in sorted(executed[phase].items())) or "none"
+        print(f"  {phase:<28} {statistics.median(timings[phase]) * 1000:8.1f} ms  {ran}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+    bench_imports(args.samples)
+    bench_reruns(args.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""Minimal local stand-in for the Gemini generateContent REST endpoint.
+
+Besides a fixed reply it can play a misbehaving service: added latency, 5xx
+errors, 429s carrying a RetryInfo delay, and JSON replies that come back
+malformed. It also serves streamGenerateContent as server-sent events, and
+reports cached tokens the way Gemini's implicit prefix caching does.
+"""
+
+import collections
+import itertools
+import json
+import os
+import random
+import re
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SSE_CHUNK_CHARS = 200
+# How many earlier requests the implicit prefix cache is matched against.
+RECENT_REQUESTS = 64
+
+
+def request_text(payload):
+    """The prompt and system instruction of a generateContent request body."""
+    def parts_text(content):
+        return "".join(part.get("text", "") for part in (content or {}).get("parts", []))
+
+    prompt = "".join(parts_text(content) for content in payload.get("contents", []))
+    return prompt, parts_text(payload.get("systemInstruction"))
+
+
+def wants_json(payload):
+    return payload.get("generationConfig", {}).get("responseMimeType") == "application/json"
+
+
+def corrupt_json(text, variant):
+    """Breaks a JSON reply the ways models do: fences and trailing commas, a cut-off tail, or a dropped field."""
+    if variant == 0:
+        return "```json\n" + re.sub(r"\}\s*$", ",}", text.strip()) + "\n```"
+    if variant == 1:
+        return text[:max(1, int(len(text) * 0.8))]
+    try:
+        obj = json.loads(text)
+    except ValueError:
+        return text[:-1]
+    if isinstance(obj, dict) and obj:
+        obj.pop(sorted(obj)[0])
+    return json.dumps(obj)
+
+
+class StubGeminiHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 with an explicit Content-Length keeps connections alive, like the real endpoint.
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; without this, Nagle plus delayed ACKs adds ~40 ms per reused connection.
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server.stub
+        payload = json.loads(raw or b"{}")
+        fault, delay = server.plan(payload)
+        prompt, instruction = request_text(payload)
+        prompt_tokens = (len(prompt) + len(instruction)) // 4
+        cached_tokens = server.cached_prefix_tokens(instruction + prompt)
+        # Cached tokens skip prefill, which is what makes time-to-first-token drop.
+        time.sleep(delay + server.prefill_seconds_per_1k * (prompt_tokens - cached_tokens) / 1000)
+        if fault == "rate_limit":
+            body = {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "details": [
+                {"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{server.retry_after}s"}
+            ]}}
+            return self.send_body(429, json.dumps(body).encode("utf-8"))
+        if fault == "error":
+            return self.send_body(500, json.dumps({"error": {"code": 500, "status": "INTERNAL"}}).encode("utf-8"))
+
+        text = server.reply_for(payload)
+        if fault == "malformed":
+            text = corrupt_json(text, server.next_corruption())
+        usage = {"promptTokenCount": prompt_tokens, "candidatesTokenCount": len(text) // 4}
+        if cached_tokens:
+            usage["cachedContentTokenCount"] = cached_tokens
+        if ":streamGenerateContent" in self.path:
+            chunks = [text[i:i + SSE_CHUNK_CHARS] for i in range(0, len(text), SSE_CHUNK_CHARS)] or [""]
+            events = []
+            for index, chunk in enumerate(chunks):
+                event = {"candidates": [{"content": {"parts": [{"text": chunk}]}}]}
+                if index == len(chunks) - 1:
+                    event["usageMetadata"] = usage
+                events.append(f"data: {json.dumps(event)}\r\n\r\n")
+            return self.send_body(200, "".join(events).encode("utf-8"), "text/event-stream")
+        body = {"candidates": [{"content": {"parts": [{"text": text}]}}], "usageMetadata": usage}
+        self.send_body(200, json.dumps(body).encode("utf-8"))
+
+    def send_body(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubGeminiServer:
+    """Serves StubGeminiHandler on an ephemeral localhost port for the duration of a with-block.
+
+    reply(payload) picks the response text per request (reply_text otherwise).
+    Each request sleeps latency ± jitter seconds, then fails with a 500 or a 429
+    at error_rate / rate_limit_rate; JSON replies are corrupted at malformed_rate.
+    Prompt tokens that are not cached add prefill_seconds_per_1k per thousand.
+    Like implicit caching, the part of a request (system instruction, then
+    prompt) that repeats the start of a recent one counts as cached once it is
+    at least implicit_cache_min_tokens long. Counts of what was served are kept
+    in stats.
+    """
+
+    def __init__(self, reply_text="ok", certfile=None, keyfile=None, reply=None, latency=0.0, jitter=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, malformed_rate=0.0, retry_after=1.0, seed=None,
+                 prefill_seconds_per_1k=0.0, implicit_cache_min_tokens=1024):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), StubGeminiHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.reply_text = reply_text
+        self.reply = reply
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.retry_after = retry_after
+        self.prefill_seconds_per_1k = prefill_seconds_per_1k
+        self.implicit_cache_min_tokens = implicit_cache_min_tokens
+        self.stats = {"requests": 0, "ok": 0, "error": 0, "rate_limit": 0, "malformed": 0, "cached_requests": 0}
+        self._recent = collections.deque(maxlen=RECENT_REQUESTS)
+        self._random = random.Random(seed)
+        self._corruptions = itertools.cycle(range(3))
+        self._lock = threading.Lock()
+        self.scheme = "http"
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+            self.scheme = "https"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"{self.scheme}://{host}:{port}/v1beta"
+
+    def plan(self, payload):
+        """Decides this request's fault (or None) and delay, and counts it."""
+        with self._lock:
+            roll = self._random.random()
+            if roll < self.error_rate:
+                fault = "error"
+            elif roll < self.error_rate + self.rate_limit_rate:
+                fault = "rate_limit"
+            elif wants_json(payload) and self._random.random() < self.malformed_rate:
+                fault = "malformed"
+            else:
+                fault = None
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            self.stats["requests"] += 1
+            self.stats[fault or "ok"] += 1
+        return fault, delay
+
+    def cached_prefix_tokens(self, text):
+        """Tokens at the start of text that a recent request already sent, or 0 below the minimum."""
+        with self._lock:
+            shared = max((len(os.path.commonprefix([text, seen])) for seen in self._recent), default=0)
+            self._recent.append(text)
+            tokens = shared // 4
+            if tokens < self.implicit_cache_min_tokens:
+                return 0
+            self.stats["cached_requests"] += 1
+            return tokens
+
+    def next_corruption(self):
+        with self._lock:
+            return next(self._corruptions)
+
+    def reply_for(self, payload):
+        return self.reply(payload) if self.reply else self.reply_text
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,60 @@
+"""Local stand-in for edge_tts.Communicate.
+
+install() registers a fake edge_tts module, so the lazy import in
+script_architect.tts picks it up instead of the real service. Each chunk takes
+latency plus a per-character delay, fails at failure_rate, and streams fake MP3
+frames sized like real speech.
+"""
+
+import asyncio
+import random
+import sys
+import threading
+import types
+
+# Edge-TTS produces roughly 24 kbit/s MP3, about 200 bytes per spoken character.
+BYTES_PER_CHAR = 200
+FRAME_BYTES = 4096
+
+
+class StubTTS:
+    def __init__(self, latency=0.05, seconds_per_char=0.0002, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.seconds_per_char = seconds_per_char
+        self.failure_rate = failure_rate
+        self.stats = {"chunks": 0, "failures": 0, "chars": 0, "bytes": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def communicate_class(self):
+        stub = self
+
+        class Communicate:
+            def __init__(self, text, voice, **kwargs):
+                self.text = text
+                self.voice = voice
+
+            async def stream(self):
+                with stub._lock:
+                    stub.stats["chunks"] += 1
+                    failed = stub._random.random() < stub.failure_rate
+                await asyncio.sleep(stub.latency + stub.seconds_per_char * len(self.text))
+                if failed:
+                    with stub._lock:
+                        stub.stats["failures"] += 1
+                    raise ConnectionResetError("stub Edge-TTS dropped the connection")
+                size = BYTES_PER_CHAR * len(self.text)
+                with stub._lock:
+                    stub.stats["chars"] += len(self.text)
+                    stub.stats["bytes"] += size
+                yield {"type": "WordBoundary", "offset": 0, "text": self.text.split()[0] if self.text.split() else ""}
+                for start in range(0, size, FRAME_BYTES):
+                    yield {"type": "audio", "data": b"\xff\xf3".ljust(min(FRAME_BYTES, size - start), b"\x00")}
+
+        return Communicate
+
+    def install(self):
+        module = types.ModuleType("edge_tts")
+        module.Communicate = self.communicate_class()
+        sys.modules["edge_tts"] = module
+        return self
@@ -0,0 +1 @@
+"""Backend modules for Script Architect Pro that outlive a single Streamlit rerun."""
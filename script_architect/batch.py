@@ -0,0 +1,234 @@
+"""Headless batch pipeline: research -> script -> voiceover -> bundle for a list of topics.
+
+Rows come from a JSONL or CSV file with the columns topic, mode, length,
+source_type, matrix and angle. Each row gets its own directory under --out.
+Finished stages are never redone, so an interrupted run can simply be restarted.
+
+    python -m script_architect.batch topics.jsonl --out runs/week-12 --workers 4
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from script_architect.pipeline import (
+    CONTENT_MODES,
+    SOURCE_TYPES,
+    VIDEO_LENGTHS,
+    assemble_script_text,
+    condense_research_for_script,
+    generate_script_package,
+    generate_youtube_bundle,
+    perform_grounded_research,
+)
+from script_architect.ratelimit import PRIORITY_BATCH, rate_limiter_stats, request_priority
+from script_architect.telemetry import get_telemetry, span
+from script_architect.tts import TTS_DEFAULT_CONCURRENCY, VOICES, generate_audio_sync, get_tts_cache
+
+logger = logging.getLogger("script_architect.batch")
+
+DEFAULT_ROW = {
+    "mode": CONTENT_MODES[0],
+    "length": VIDEO_LENGTHS[1],
+    "source_type": SOURCE_TYPES[0],
+    "matrix": {},
+}
+
+
+class RowError(Exception):
+    """A stage produced an unusable result; the row is marked failed and retried on the next run."""
+
+
+def load_rows(path):
+    """Reads topic rows from a .jsonl or .csv file, filling in the UI defaults."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            raw_rows = list(csv.DictReader(f))
+        else:
+            raw_rows = [json.loads(line) for line in f if line.strip()]
+
+    rows = []
+    for index, raw in enumerate(raw_rows, start=1):
+        row = dict(DEFAULT_ROW)
+        row.update({key: value for key, value in raw.items() if value not in (None, "")})
+        if not row.get("topic") or not row.get("angle"):
+            raise ValueError(f"Row {index} of {path} needs both 'topic' and 'angle'.")
+        if row["mode"] not in CONTENT_MODES:
+            raise ValueError(f"Row {index}: unknown mode {row['mode']!r}; expected one of {CONTENT_MODES}.")
+        if row["length"] not in VIDEO_LENGTHS:
+            raise ValueError(f"Row {index}: unknown length {row['length']!r}; expected one of {VIDEO_LENGTHS}.")
+        # The UI passes the tuning matrix to the prompt as str(dict); CSV cells arrive as text already.
+        if not isinstance(row["matrix"], str):
+            row["matrix"] = str(row["matrix"])
+        slug = re.sub(r"[^a-z0-9]+", "-", row["topic"].lower()).strip("-")[:48] or "topic"
+        row["row_id"] = f"{index:04d}-{slug}"
+        rows.append(row)
+    return rows
+
+
+def write_atomic(path, data):
+    """Writes via a temp file and rename so a crash never leaves a half-written artifact."""
+    tmp_path = path + ".tmp"
+    mode = "wb" if isinstance(data, bytes) else "w"
+    with open(tmp_path, mode, **({} if isinstance(data, bytes) else {"encoding": "utf-8"})) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_status(row_dir):
+    try:
+        with open(os.path.join(row_dir, "status.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def process_row(row, out_dir, api_key, voice, tts_concurrency, voiceover=True):
+    """Runs every missing stage for one row and returns its status record."""
+    # Batch work queues behind interactive sessions sharing the same API key.
+    with request_priority(PRIORITY_BATCH), span("batch.row", row_id=row["row_id"]) as row_span:
+        status = _process_row(row, out_dir, api_key, voice, tts_concurrency, voiceover)
+        if status["state"] == "failed":
+            row_span.fail(status["error"])
+        return status
+
+
+def _process_row(row, out_dir, api_key, voice, tts_concurrency, voiceover):
+    row_dir = os.path.join(out_dir, row["row_id"])
+    os.makedirs(row_dir, exist_ok=True)
+    status = {"row_id": row["row_id"], "topic": row["topic"], "state": "running", "timings": {}}
+    status["timings"].update(read_status(row_dir).get("timings", {}))
+
+    def artifact(name):
+        return os.path.join(row_dir, name)
+
+    def stage(name, target, run):
+        if os.path.exists(target):
+            return
+        started = time.perf_counter()
+        run()
+        status["timings"][name] = round(time.perf_counter() - started, 2)
+        logger.info("[%s] %s done in %.1fs", row["row_id"], name, status["timings"][name])
+
+    def research_stage():
+        research = perform_grounded_research(
+            topic=row["topic"], mode=row["mode"], source_type=row["source_type"],
+            angle=row["angle"], length=row["length"], api_key=api_key
+        )
+        if not research or research.startswith("Error:"):
+            raise RowError(f"research failed: {research}")
+        write_atomic(artifact("research.md"), research)
+
+    def script_stage():
+        with open(artifact("research.md"), encoding="utf-8") as f:
+            research = f.read()
+        research, condense_stats = condense_research_for_script(
+            row["topic"], research, row["angle"], row["matrix"], row["source_type"], row["length"]
+        )
+        status["prompt_tokens"] = {
+            "before": condense_stats["prompt_tokens_before"],
+            "after": condense_stats["prompt_tokens_after"],
+        }
+        package = generate_script_package(
+            mode=row["mode"], topic=row["topic"], research=research, angle=row["angle"],
+            matrix=row["matrix"], source_type=row["source_type"], length=row["length"], api_key=api_key
+        )
+        if "error" in package:
+            write_atomic(artifact("package.error.json"), json.dumps(package, indent=2))
+            raise RowError(package["error"])
+        if package.get("unresolved"):
+            status.setdefault("unresolved", {})["script"] = package["unresolved"]
+            logger.warning("[%s] script fields left empty: %s", row["row_id"], ", ".join(package["unresolved"]))
+        write_atomic(artifact("script.txt"), assemble_script_text(package))
+        write_atomic(artifact("package.json"), json.dumps(package, indent=2, ensure_ascii=False))
+
+    def voiceover_stage():
+        with open(artifact("script.txt"), encoding="utf-8") as f:
+            script_text = f.read()
+        audio = generate_audio_sync(script_text, voice, max_concurrency=tts_concurrency, cache=get_tts_cache())
+        write_atomic(artifact("voiceover.mp3"), audio)
+
+    def bundle_stage():
+        with open(artifact("script.txt"), encoding="utf-8") as f:
+            script_text = f.read()
+        bundle = generate_youtube_bundle(api_key, script_text)
+        if "error" in bundle:
+            raise RowError(bundle["error"])
+        if bundle.get("unresolved"):
+            status.setdefault("unresolved", {})["bundle"] = bundle["unresolved"]
+            logger.warning("[%s] bundle fields left empty: %s", row["row_id"], ", ".join(bundle["unresolved"]))
+        write_atomic(artifact("bundle.json"), json.dumps(bundle, indent=2, ensure_ascii=False))
+
+    try:
+        stage("research", artifact("research.md"), research_stage)
+        stage("script", artifact("package.json"), script_stage)
+        if voiceover:
+            stage("voiceover", artifact("voiceover.mp3"), voiceover_stage)
+        stage("bundle", artifact("bundle.json"), bundle_stage)
+        status["state"] = "complete"
+    except Exception as e:
+        status["state"] = "failed"
+        status["error"] = str(e)
+        logger.error("[%s] failed: %s", row["row_id"], e)
+    write_atomic(artifact("status.json"), json.dumps(status, indent=2))
+    return status
+
+
+def run_batch(rows, out_dir, api_key, workers=4, voice=VOICES[0][0], tts_concurrency=TTS_DEFAULT_CONCURRENCY, voiceover=True):
+    """Processes rows on a bounded worker pool, skipping rows that completed in an earlier run."""
+    os.makedirs(out_dir, exist_ok=True)
+    pending = [row for row in rows if read_status(os.path.join(out_dir, row["row_id"])).get("state") != "complete"]
+    logger.info("%d rows, %d already complete, %d to process with %d workers",
+                len(rows), len(rows) - len(pending), len(pending), workers)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(process_row, row, out_dir, api_key, voice, tts_concurrency, voiceover) for row in pending]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    with open(os.path.join(out_dir, "summary.jsonl"), "a", encoding="utf-8") as f:
+        for status in results:
+            f.write(json.dumps(status) + "\n")
+    limiter_stats = rate_limiter_stats(api_key)
+    if limiter_stats:
+        logger.info("Gemini rate limiter: %d requests, mean wait %.1fs, max wait %.1fs, %d rate-limit pauses",
+                    limiter_stats["granted"], limiter_stats["mean_wait_s"], limiter_stats["max_wait_s"], limiter_stats["throttled"])
+    for name, stats in get_telemetry().stage_stats().items():
+        logger.info("Stage %-16s %4d spans, %d errors, p50 %.1fs, p95 %.1fs, max %.1fs",
+                    name, stats["count"], stats["errors"], stats["p50_s"], stats["p95_s"], stats["max_s"])
+    get_telemetry().flush()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Script Architect pipeline for a list of topics.")
+    parser.add_argument("rows", help="JSONL or CSV file with topic, mode, length, source_type, matrix, angle")
+    parser.add_argument("--out", default="batch_output", help="Output directory (one sub-directory per row)")
+    parser.add_argument("--workers", type=int, default=4, help="Topics processed concurrently")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"), help="Defaults to $GEMINI_API_KEY")
+    parser.add_argument("--voice", default=VOICES[0][0], choices=[voice for voice, _ in VOICES])
+    parser.add_argument("--tts-concurrency", type=int, default=TTS_DEFAULT_CONCURRENCY)
+    parser.add_argument("--no-voiceover", action="store_true", help="Skip the TTS stage")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not args.api_key:
+        parser.error("a Gemini API key is required (--api-key or $GEMINI_API_KEY)")
+
+    rows = load_rows(args.rows)
+    results = run_batch(rows, args.out, args.api_key, args.workers, args.voice, args.tts_concurrency,
+                        voiceover=not args.no_voiceover)
+    failed = [status for status in results if status["state"] != "complete"]
+    logger.info("Finished: %d complete, %d failed", len(results) - len(failed), len(failed))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
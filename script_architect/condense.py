@@ -0,0 +1,136 @@
+"""Research condensation: token estimates, fact/URL de-duplication and budgeted extractive compression."""
+
+import math
+import re
+
+URL_PATTERN = re.compile(r"https?://[^\s<>()\[\]\"']+")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+STOPWORDS = frozenset("""
+    a an and are as at be but by for from has have how i in is it its of on or that the their this to was
+    were what when where which who why will with you your my me we our they them he she his her not do does
+""".split())
+NEAR_DUPLICATE_OVERLAP = 0.85
+
+
+def estimate_tokens(text):
+    """Approximates Gemini tokens offline (~4 characters per token for English prose)."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def normalize_fact(text):
+    """Reduces a line to lowercase words without URLs or punctuation, for duplicate detection."""
+    return re.sub(r"[\W_]+", " ", URL_PATTERN.sub("", text)).strip().lower()
+
+
+def clean_url(url):
+    return url.rstrip(".,;:")
+
+
+def _words(text):
+    return {word for word in normalize_fact(text).split() if word.isdigit() or (word not in STOPWORDS and len(word) > 2)}
+
+
+def split_units(research):
+    """Splits a briefing into (heading, unit) pairs where each unit is a single fact or sentence."""
+    heading = None
+    units = []
+    for line in research.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if stripped.startswith("#"):
+            heading = stripped
+            continue
+        if stripped.lower().rstrip(":") in ("sources", "references", "**sources**"):
+            heading = None
+            continue
+        bullet = re.match(r"^([-*•]|\d+[.)])\s+", stripped)
+        prefix = "- " if bullet else ""
+        body = stripped[bullet.end():] if bullet else stripped
+        for sentence in SENTENCE_BOUNDARY.split(body):
+            if normalize_fact(sentence):
+                units.append((heading, prefix + sentence.strip()))
+    return units
+
+
+def condense_research(research, budget, focus=""):
+    """Condenses a research briefing to roughly `budget` tokens.
+
+    Repeated facts and URLs are removed first; inline URLs become numbered
+    references to a single sources list. If the briefing is still over budget,
+    the facts most relevant to `focus` (and those carrying dates, figures or
+    citations) are kept, in their original order.
+
+    Returns (condensed_text, stats).
+    """
+    stats = {"tokens_before": estimate_tokens(research), "budget": budget}
+    urls = []
+    seen = []
+    facts = []
+    duplicates = 0
+    for heading, unit in split_units(research):
+        words = _words(unit)
+        key = normalize_fact(unit)
+        if any(key == other_key or (words and len(words & other_words) / len(words | other_words) >= NEAR_DUPLICATE_OVERLAP)
+               for other_key, other_words in seen):
+            duplicates += 1
+            continue
+        seen.append((key, words))
+
+        refs = []
+        for url in URL_PATTERN.findall(unit):
+            url = clean_url(url)
+            if url.rstrip("/") not in [known.rstrip("/") for known in urls]:
+                urls.append(url)
+            refs.append(next(index for index, known in enumerate(urls, start=1) if known.rstrip("/") == url.rstrip("/")))
+        text = re.sub(r"\(\s*\)", "", URL_PATTERN.sub("", unit))
+        text = re.sub(r"\s+([.,;:!?])", r"\1", " ".join(text.split()))
+        facts.append({"heading": heading, "text": text, "refs": sorted(set(refs)), "words": words})
+
+    urls_in_text = len(URL_PATTERN.findall(research))
+    stats["duplicate_facts"] = duplicates
+    stats["duplicate_urls"] = max(0, urls_in_text - len(urls))
+
+    def render(kept):
+        # References are renumbered so only the sources that survive are listed.
+        used_refs = sorted({ref for fact in kept for ref in fact["refs"]})
+        numbering = {ref: number for number, ref in enumerate(used_refs, start=1)}
+        lines = []
+        heading = None
+        for fact in kept:
+            if fact["heading"] != heading and fact["heading"]:
+                lines.append(("\n" if lines else "") + fact["heading"])
+            heading = fact["heading"]
+            refs = "".join(f"[{numbering[ref]}]" for ref in fact["refs"])
+            lines.append(f"{fact['text']} {refs}".strip())
+        if used_refs:
+            lines.append("\nSources:")
+            lines.extend(f"[{numbering[ref]}] {urls[ref - 1]}" for ref in used_refs)
+        return "\n".join(lines).strip()
+
+    condensed = render(facts)
+    if stats["tokens_before"] <= budget and estimate_tokens(condensed) >= stats["tokens_before"]:
+        # Already within budget and nothing to gain: hand the briefing through untouched.
+        stats.update(dropped_for_budget=0, tokens_after=stats["tokens_before"])
+        return research, stats
+
+    dropped = 0
+    if estimate_tokens(condensed) > budget:
+        focus_words = _words(focus)
+
+        def score(fact):
+            relevance = len(fact["words"] & focus_words) / (len(focus_words) or 1)
+            return relevance * 3 + (1 if re.search(r"\d", fact["text"]) else 0) + (0.5 if fact["refs"] else 0)
+
+        ranked = sorted(range(len(facts)), key=lambda index: score(facts[index]), reverse=True)
+        chosen = set()
+        for index in ranked:
+            candidate = chosen | {index}
+            if estimate_tokens(render([facts[i] for i in sorted(candidate)])) <= budget:
+                chosen = candidate
+        dropped = len(facts) - len(chosen)
+        condensed = render([facts[i] for i in sorted(chosen)])
+
+    stats["dropped_for_budget"] = dropped
+    stats["tokens_after"] = estimate_tokens(condensed)
+    return condensed, stats
@@ -0,0 +1,403 @@
+"""Gemini access: one long-lived client per API key and the call helpers built on it.
+
+Calls are coroutines on the shared runtime loop; call_gemini is the blocking
+entry point for the UI, batch and pipeline threads.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from script_architect.condense import estimate_tokens
+from script_architect.latency import GEMINI_HEDGE, get_latency_tracker
+from script_architect.llm_cache import LLM_CACHE_ENABLED, get_llm_cache
+from script_architect.ratelimit import PRIORITY_INTERACTIVE, backoff_delay, current_priority, get_rate_limiter
+from script_architect.runtime import get_runtime
+from script_architect.telemetry import count, current_span, span
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta").rstrip("/")
+GEMINI_POOL_SIZE = int(os.environ.get("GEMINI_POOL_SIZE", "16"))
+# "sdk" sends plain calls through google-generativeai; "rest" sends every call to GEMINI_API_BASE.
+GEMINI_TRANSPORT = os.environ.get("GEMINI_TRANSPORT", "sdk")
+MAX_CACHED_MODELS = 64
+GEMINI_TIMEOUT = 60
+GEMINI_MAX_ATTEMPTS = 5
+
+
+class GeminiHTTPError(Exception):
+    """A non-2xx response from the REST endpoint, with its body kept for the error message."""
+
+    def __init__(self, status, reason, body, retry_after=None):
+        super().__init__(f"{status} {reason}\nResponse Content: {body or 'No response content'}")
+        self.status = status
+        self.body = body
+        self.retry_after = retry_after
+
+    @classmethod
+    async def from_response(cls, response):
+        body = await response.text()
+        return cls(response.status, response.reason, body, parse_retry_after(response.headers.get("Retry-After"), body))
+
+
+def parse_retry_after(header, body=""):
+    """Seconds to wait from a Retry-After header, or from the RetryInfo Gemini puts in 429 bodies."""
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            pass
+    match = re.search(r'"retryDelay"\s*:\s*"([\d.]+)s"', body or "")
+    return float(match.group(1)) if match else None
+
+
+def is_rate_limited(error):
+    """True for 429/503 from the REST endpoint or the SDK (google.api_core exceptions carry .code)."""
+    status = getattr(error, "status", None) or getattr(error, "code", None)
+    return status in (429, 503)
+
+
+class GeminiClient:
+    """Gemini access for one API key, used from the shared runtime loop.
+
+    Holds a keep-alive aiohttp connection pool for the REST endpoint and memoizes
+    GenerativeModel objects per (system_instruction, generation_config), so
+    repeated calls skip the TLS handshake and the SDK setup.
+    """
+
+    def __init__(self, api_key, api_base=GEMINI_API_BASE, pool_size=GEMINI_POOL_SIZE):
+        self.api_key = api_key
+        self.api_base = api_base.rstrip("/")
+        self.pool_size = pool_size
+        # The header keeps the key out of URLs, and therefore out of proxy and error logs.
+        self.headers = {"Content-Type": "application/json", "x-goog-api-key": api_key}
+        # Set to False before the first request to accept a self-signed local stub.
+        self.verify = True
+        self._http = None
+        self._models = OrderedDict()
+        self._service_client = None
+        self._lock = threading.Lock()
+
+    def rest_url(self, method):
+        return f"{self.api_base}/models/{GEMINI_MODEL}:{method}"
+
+    def http(self):
+        """Returns the pooled aiohttp session. It belongs to the runtime loop, so only call this from there."""
+        if self._http is None or self._http.closed:
+            # The SDKs are imported on first use so the app starts without paying for them.
+            import aiohttp
+            self._http = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.pool_size, ssl=self.verify),
+                # Like a requests timeout: bounds connecting and each read, not a long stream as a whole.
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=GEMINI_TIMEOUT, sock_read=GEMINI_TIMEOUT),
+                read_bufsize=2 ** 20
+            )
+        return self._http
+
+    def _generative_service_client(self):
+        if self._service_client is None:
+            from google.ai import generativelanguage as glm
+            self._service_client = glm.GenerativeServiceAsyncClient(client_options={"api_key": self.api_key})
+        return self._service_client
+
+    def model(self, system_instruction="", is_json=False):
+        """Returns the memoized GenerativeModel for this instruction/config pair."""
+        gen_config = {"response_mime_type": "application/json"} if is_json else None
+        key = (system_instruction or "", json.dumps(gen_config, sort_keys=True))
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+            import google.generativeai as genai
+            model = genai.GenerativeModel(
+                model_name=GEMINI_MODEL,
+                system_instruction=system_instruction or None,
+                generation_config=gen_config
+            )
+            # genai.configure() is process-global, so two sessions with different keys
+            # would race on it. Binding a per-key transport to the model avoids that.
+            # It relies on a private attribute; sdk_binding_supported() checks it is still there.
+            model._async_client = self._generative_service_client()
+            self._models[key] = model
+            if len(self._models) > MAX_CACHED_MODELS:
+                self._models.popitem(last=False)
+            return model
+
+    async def post_json(self, method, payload, timeout=None):
+        async with self.http().post(self.rest_url(method), json=payload, **request_timeout(timeout)) as response:
+            if response.status >= 400:
+                raise await GeminiHTTPError.from_response(response)
+            return await response.json(content_type=None)
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.close()
+
+
+def request_timeout(seconds):
+    """aiohttp request kwargs that replace the session's read timeout with seconds, if given."""
+    if seconds is None:
+        return {}
+    import aiohttp
+    return {"timeout": aiohttp.ClientTimeout(total=None, sock_connect=GEMINI_TIMEOUT, sock_read=seconds)}
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """Returns the process-wide GeminiClient for api_key, creating it on first use.
+
+    This module is imported once per process, so the registry survives Streamlit
+    reruns and is shared by every session.
+    """
+    with _clients_lock:
+        if not _clients:
+            get_runtime().add_shutdown_hook(close_clients)
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = GeminiClient(api_key)
+        return client
+
+
+async def close_clients():
+    for client in list(_clients.values()):
+        await client.aclose()
+
+
+def record_usage(prompt_tokens, response_tokens, cached_tokens=0):
+    """Adds the token usage Gemini reports for a response to the current span and the token counters.
+
+    prompt_tokens includes cached_tokens, which are billed at the reduced cached rate.
+    """
+    current = current_span()
+    if current is not None:
+        current.add(prompt_tokens=prompt_tokens or 0, response_tokens=response_tokens or 0,
+                    cached_tokens=cached_tokens or 0)
+    count("gemini_tokens", prompt_tokens or 0, kind="prompt")
+    count("gemini_tokens", cached_tokens or 0, kind="cached")
+    count("gemini_tokens", response_tokens or 0, kind="response")
+
+
+def record_sdk_usage(response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        record_usage(usage.prompt_token_count, usage.candidates_token_count,
+                     getattr(usage, "cached_content_token_count", 0))
+
+
+def record_rest_usage(result):
+    usage = result.get("usageMetadata")
+    if usage:
+        record_usage(usage.get("promptTokenCount"), usage.get("candidatesTokenCount"), usage.get("cachedContentTokenCount"))
+
+
+def search_payload(prompt, system_instruction):
+    return {
+        "contents": [{"parts": [{"text": prompt}]}],
+        "systemInstruction": {"parts": [{"text": system_instruction}]},
+        "tools": [{"google_search": {}}]
+    }
+
+
+def rest_payload(prompt, system_instruction="", use_search=False, is_json=False):
+    if use_search:
+        return search_payload(prompt, system_instruction)
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if system_instruction:
+        payload["systemInstruction"] = {"parts": [{"text": system_instruction}]}
+    if is_json:
+        payload["generationConfig"] = {"responseMimeType": "application/json"}
+    return payload
+
+
+@functools.lru_cache(maxsize=None)
+def sdk_binding_supported():
+    """True if the installed SDK still keeps a model's transport in GenerativeModel._async_client.
+
+    GeminiClient.model() rebinds that private attribute per API key. An SDK
+    release that moves it would silently send every call with whichever key
+    genai.configure() saw last, so the SDK transport is then not used at all.
+    """
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        logger.warning("google-generativeai is not installed; GEMINI_TRANSPORT=sdk falls back to REST")
+        return False
+    if "_async_client" not in vars(genai.GenerativeModel(model_name=GEMINI_MODEL)):
+        logger.warning("This google-generativeai release has no GenerativeModel._async_client; "
+                       "GEMINI_TRANSPORT=sdk falls back to REST")
+        return False
+    return True
+
+
+def uses_sdk(use_search):
+    # Grounded search always goes over REST; the SDK path has no google_search tool.
+    return not use_search and GEMINI_TRANSPORT == "sdk" and sdk_binding_supported()
+
+
+async def stream_gemini(client, prompt, system_instruction="", use_search=False, is_json=False, timeout=None):
+    """Yields response text deltas as Gemini produces them (SDK stream or REST server-sent events)."""
+    if uses_sdk(use_search):
+        model = client.model(system_instruction, is_json)
+        response = await model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks carrying only finish/safety metadata have no text parts.
+                continue
+            if text:
+                yield text
+        record_sdk_usage(response)
+    else:
+        url = client.rest_url("streamGenerateContent") + "?alt=sse"
+        data = rest_payload(prompt, system_instruction, use_search, is_json)
+        usage = {}
+        async with client.http().post(url, json=data, **request_timeout(timeout)) as response:
+            if response.status >= 400:
+                raise await GeminiHTTPError.from_response(response)
+            async for raw_line in response.content:
+                line = raw_line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):].strip())
+                # Every event repeats the running totals; the last one counts.
+                usage = event.get("usageMetadata") or usage
+                for candidate in event.get('candidates', [])[:1]:
+                    for part in candidate.get('content', {}).get('parts', []):
+                        if part.get('text'):
+                            yield part['text']
+        record_rest_usage({"usageMetadata": usage})
+
+
+async def generate_once(client, prompt, system_instruction="", use_search=False, is_json=False, timeout=None):
+    if uses_sdk(use_search):
+        model = client.model(system_instruction, is_json)
+        response = await model.generate_content_async(prompt)
+        record_sdk_usage(response)
+        return response.text
+
+    result = await client.post_json("generateContent", rest_payload(prompt, system_instruction, use_search, is_json), timeout)
+    record_rest_usage(result)
+    if 'candidates' in result and len(result['candidates']) > 0:
+        parts = result['candidates'][0]['content']['parts']
+        text_parts = [part.get('text', '') for part in parts if 'text' in part]
+        return '\n'.join(text_parts)
+    return "Error: Unexpected response format"
+
+
+async def call_gemini_uncached(api_key, prompt, system_instruction="", use_search=False, is_json=False, on_chunk=None,
+                               call_type="default"):
+    """One Gemini request with rate-limited, jittered retries; with on_chunk the response is streamed into it.
+
+    Grounded-search requests get a timeout adapted to recent latencies of their
+    call type, and interactive ones are hedged with a duplicate after the p95.
+    """
+    client = get_client(api_key)
+    limiter = get_rate_limiter(api_key)
+    tracker = get_latency_tracker()
+    prompt_tokens = estimate_tokens(prompt) + estimate_tokens(system_instruction or "")
+    latency_key = f"{call_type}/{'first-chunk' if on_chunk else 'response'}"
+    hedge = GEMINI_HEDGE and use_search and current_priority() == PRIORITY_INTERACTIVE
+
+    def can_hedge():
+        # A hedge is only worth sending if it does not have to queue for quota.
+        return limiter.try_acquire(prompt_tokens)
+
+    for attempt in range(GEMINI_MAX_ATTEMPTS):
+        if attempt:
+            count("gemini_retries", call_type=call_type)
+        current = current_span()
+        if current is not None:
+            current.add(attempts=1)
+        received = []
+        await limiter.acquire(prompt_tokens)
+        timeout = tracker.timeout(latency_key, GEMINI_TIMEOUT) if use_search else None
+        try:
+            if on_chunk is None:
+                result = await tracker.call(
+                    latency_key,
+                    lambda: generate_once(client, prompt, system_instruction, use_search, is_json, timeout),
+                    hedge, can_hedge
+                )
+            else:
+                stream = tracker.stream(
+                    latency_key,
+                    lambda: stream_gemini(client, prompt, system_instruction, use_search, is_json, timeout),
+                    hedge, can_hedge
+                )
+                async for delta in stream:
+                    received.append(delta)
+                    on_chunk(delta)
+                result = "".join(received)
+            limiter.record(estimate_tokens(result))
+            return result
+        except Exception as e:
+            # Once text has reached the UI a silent retry would render it twice.
+            if received or attempt == GEMINI_MAX_ATTEMPTS - 1:
+                # Timeouts carry no message of their own.
+                return f"Error: {str(e) or type(e).__name__}"
+            delay = backoff_delay(attempt)
+            if is_rate_limited(e):
+                count("gemini_rate_limited", call_type=call_type)
+                # Pause the key for everyone; the next acquire() waits it out.
+                limiter.penalize(max(getattr(e, "retry_after", None) or 0, delay))
+            else:
+                await asyncio.sleep(delay)
+
+
+async def call_gemini_async(api_key, prompt, system_instruction="", use_search=False, is_json=False, on_chunk=None,
+                            call_type="default", refresh_cache=False):
+    """Calls Gemini through the persistent response cache.
+
+    call_type selects the cache TTL ("research", "research_facet", "script",
+    "bundle") and keys the latency statistics. With refresh_cache the lookup
+    is skipped but the new response is still stored. Each call is traced as a
+    gemini.call span under the caller's stage.
+    """
+    with span("gemini.call", call_type=call_type, search=use_search, json=is_json, stream=on_chunk is not None,
+              prompt_chars=len(prompt) + len(system_instruction or "")) as current:
+        if not LLM_CACHE_ENABLED:
+            response = await call_gemini_uncached(api_key, prompt, system_instruction, use_search, is_json, on_chunk,
+                                                  call_type)
+            computed = True
+        else:
+            cache = get_llm_cache()
+            tools = search_payload("", "")["tools"] if use_search else None
+            key = cache.make_key(GEMINI_MODEL, system_instruction, prompt, tools, is_json)
+            response, computed = await cache.fetch_async(
+                key,
+                call_type,
+                lambda: call_gemini_uncached(api_key, prompt, system_instruction, use_search, is_json, on_chunk,
+                                             call_type),
+                refresh=refresh_cache
+            )
+            # Cached and coalesced responses arrive whole; hand them to streaming callers in one piece.
+            if on_chunk is not None and not computed:
+                on_chunk(response)
+        current.set(response_chars=len(response or ""), cached=not computed)
+        count("gemini_calls", call_type=call_type, cache="miss" if computed else "hit")
+        if response.startswith("Error:"):
+            current.fail(response)
+        return response
+
+
+def call_gemini(api_key, prompt, system_instruction="", use_search=False, is_json=False, on_chunk=None,
+                call_type="default", refresh_cache=False):
+    """Blocking call_gemini_async on the shared runtime; on_chunk runs on the calling thread."""
+    return get_runtime().run_with_events(
+        lambda emit: call_gemini_async(api_key, prompt, system_instruction, use_search, is_json,
+                                       emit if on_chunk else None, call_type, refresh_cache),
+        on_chunk
+    )
@@ -0,0 +1,290 @@
+"""Tolerant parsing of model JSON: structural repair, field salvage and schema validation."""
+
+import ast
+import json
+import re
+
+from script_architect.jsonstream import ESCAPE, IncrementalJSONParser
+
+NUMBER = (int, float)
+FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+
+
+def _strip_wrapping(text):
+    """Drops markdown fences and any prose around the top-level object.
+
+    If the object never closes (truncated output) everything from its opening
+    brace on is kept.
+    """
+    text = FENCE.sub("", text or "").strip()
+    start = text.find("{")
+    if start == -1:
+        return text
+    depth = 0
+    in_string = False
+    escape = False
+    for index in range(start, len(text)):
+        ch = text[index]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:index + 1]
+    return text[start:]
+
+
+def _is_closing_quote(text, index):
+    """Decides whether the quote at text[index], seen inside a string, ends it.
+
+    Models forget to escape quotes in prose ("the so-called "chosen one" arc"),
+    so a quote only closes the string when what follows is JSON structure.
+    """
+    rest = text[index + 1:].lstrip()
+    if not rest or rest[0] in "}]:":
+        return True
+    if rest[0] == ",":
+        after = rest[1:].lstrip()
+        return not after or after[0] in "\"{[}]"
+    return False
+
+
+def _escape_strings(text):
+    """Escapes stray quotes, stray backslashes and raw control characters inside strings.
+
+    Returns the escaped text and the closers still owed for unterminated
+    objects/arrays. A string cut off by truncation is dropped entirely, so
+    a half-written field is reported missing instead of accepted.
+    """
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    string_start = 0
+    for index, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                # A backslash that starts no valid escape (models write \' for apostrophes) becomes literal.
+                if not ESCAPE.match(text, index).group(1):
+                    out.append("\\\\")
+                    continue
+                escape = True
+            elif ch == '"':
+                if _is_closing_quote(text, index):
+                    in_string = False
+                else:
+                    out.append('\\"')
+                    continue
+            elif ch in "\n\r\t":
+                out.append({"\n": "\\n", "\r": "\\r", "\t": "\\t"}[ch])
+                continue
+            out.append(ch)
+            continue
+
+        if ch == '"':
+            in_string = True
+            string_start = len(out)
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+        out.append(ch)
+
+    if in_string:
+        del out[string_start:]
+    return "".join(out), "".join(reversed(stack))
+
+
+def _repair_structure(text):
+    """Returns text with strings escaped, a truncated tail trimmed, brackets closed and trailing commas removed."""
+    escaped, closers = _escape_strings(text)
+    # A truncated document can end on a dangling '"key":' or a comma.
+    escaped = re.sub(r'"(?:[^"\\]|\\.)*"\s*:\s*$', "", escaped.rstrip())
+    escaped = re.sub(r",\s*$", "", escaped.rstrip())
+    return re.sub(r",\s*([}\]])", r"\1", escaped + closers)
+
+
+def _from_paths(values):
+    """Rebuilds a nested object from the (path, value) pairs an IncrementalJSONParser collected."""
+    root = {}
+    for path, value in values.items():
+        node = root
+        for depth, key in enumerate(path):
+            last = depth == len(path) - 1
+            child_default = value if last else ([] if isinstance(path[depth + 1], int) else {})
+            if isinstance(node, list):
+                while len(node) <= key:
+                    node.append(None)
+                if last:
+                    node[key] = value
+                elif node[key] is None:
+                    node[key] = child_default
+                node = node[key]
+            else:
+                if last:
+                    node[key] = value
+                else:
+                    node = node.setdefault(key, child_default)
+    return root
+
+
+def repair_json(text):
+    """Parses model output as leniently as possible.
+
+    Returns (obj, method) where method is "strict", "repaired", "literal",
+    "salvaged" (only the fields that were complete) or "failed" (obj is None).
+    """
+    body = _strip_wrapping(text)
+    for method, attempt in (
+        ("strict", lambda: json.loads(body)),
+        ("repaired", lambda: json.loads(_repair_structure(body))),
+        ("literal", lambda: ast.literal_eval(body)),
+    ):
+        try:
+            obj = attempt()
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            continue
+        if isinstance(obj, dict):
+            return obj, method
+
+    parser = IncrementalJSONParser()
+    try:
+        parser.feed(_escape_strings(body)[0])
+    except (ValueError, RecursionError):
+        return None, "failed"
+    salvaged = _from_paths(parser.values)
+    if salvaged:
+        return salvaged, "salvaged"
+    return None, "failed"
+
+
+def _coerce(value, spec):
+    """Fixes harmless type slips (numeric strings, comma-separated lists); returns (value, ok)."""
+    if spec is str:
+        return value, isinstance(value, str) and bool(value.strip())
+    if spec is NUMBER:
+        if isinstance(value, str) and re.fullmatch(r"\s*-?\d+(\.\d+)?\s*", value):
+            value = float(value) if "." in value else int(value)
+        return value, isinstance(value, NUMBER) and not isinstance(value, bool)
+    if isinstance(spec, dict):
+        return value, isinstance(value, dict) and not validate(value, spec)
+    if isinstance(spec, list):
+        if isinstance(value, str) and spec[0] is str:
+            value = [item.strip() for item in value.split(",") if item.strip()]
+        if not isinstance(value, list):
+            return value, False
+        coerced = []
+        for item in value:
+            item, ok = _coerce(item, spec[0])
+            if not ok:
+                return value, False
+            coerced.append(item)
+        return coerced, True
+    return value, False
+
+
+def validate(obj, schema):
+    """Checks obj against a schema of nested dicts, [item] lists, str and NUMBER.
+
+    Coerces fixable values in place and returns the dotted paths of fields that
+    are missing or invalid. Scalar members of nested objects are reported
+    individually ("full_script.act2"); a broken list is reported as a whole.
+    """
+    problems = []
+
+    def check(node, node_schema, prefix):
+        for key, spec in node_schema.items():
+            path = f"{prefix}{key}"
+            if isinstance(spec, dict):
+                child = node.get(key)
+                if not isinstance(child, dict):
+                    node[key] = child = {}
+                check(child, spec, path + ".")
+                continue
+            value, ok = _coerce(node.get(key), spec)
+            if ok:
+                node[key] = value
+            else:
+                problems.append(path)
+
+    check(obj, schema, "")
+    return problems
+
+
+def schema_template(schema, paths):
+    """Builds the JSON skeleton of just the given dotted paths, for a follow-up request."""
+    def example(spec):
+        if isinstance(spec, dict):
+            return {key: example(value) for key, value in spec.items()}
+        if isinstance(spec, list):
+            return [example(spec[0])]
+        return "String" if spec is str else 0
+
+    template = {}
+    for path in paths:
+        spec = schema
+        node = template
+        keys = path.split(".")
+        for depth, key in enumerate(keys):
+            spec = spec[key]
+            if depth == len(keys) - 1:
+                node[key] = example(spec)
+            else:
+                node = node.setdefault(key, {})
+    return template
+
+
+def merge_fields(obj, patch, paths):
+    """Copies only the requested dotted paths from patch into obj."""
+    for path in paths:
+        keys = path.split(".")
+        source = patch
+        for key in keys:
+            source = source.get(key) if isinstance(source, dict) else None
+        if source is None:
+            continue
+        node = obj
+        for key in keys[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        node[keys[-1]] = source
+    return obj
+
+
+def fill_defaults(obj, schema, paths):
+    """Sets each dotted path to an empty value of its schema type ("", 0 or []), so readers need no None checks."""
+    for path in paths:
+        *parents, leaf = path.split(".")
+        spec, node = schema, obj
+        for key in parents:
+            spec = spec[key]
+            node = node.setdefault(key, {})
+        spec = spec[leaf]
+        node[leaf] = [] if isinstance(spec, list) else "" if spec is str else 0
+    return obj
+
+
+def without_fields(obj, paths):
+    """Returns a deep copy of obj with the given dotted paths removed."""
+    copy = json.loads(json.dumps(obj))
+    for path in paths:
+        keys = path.split(".")
+        node = copy
+        for key in keys[:-1]:
+            node = node.get(key) if isinstance(node, dict) else None
+        if isinstance(node, dict):
+            node.pop(keys[-1], None)
+    return copy
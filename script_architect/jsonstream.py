@@ -0,0 +1,113 @@
+"""Incremental JSON parsing for rendering streamed model output field by field."""
+
+import json
+import re
+
+# A valid JSON escape, or (group 1 unset) a backslash that starts none, e.g. the \' models write for apostrophes.
+ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|["\\/bfnrt])|\\')
+
+
+def fix_escapes(text):
+    """Doubles every backslash that does not start a valid JSON escape, so it survives as a literal backslash."""
+    return ESCAPE.sub(lambda match: match.group(0) if match.group(1) else "\\\\", text)
+
+
+def decode_string(raw):
+    """Decodes the body of a JSON string leniently: raw newlines/tabs and stray backslashes are kept as text."""
+    try:
+        # strict=False accepts raw control characters, which models often emit inside long strings.
+        return json.loads('"' + fix_escapes(raw) + '"', strict=False)
+    except ValueError:
+        return raw
+
+
+class IncrementalJSONParser:
+    """Consumes a JSON document in arbitrary pieces and reports every scalar value as soon as it is complete.
+
+    Values are keyed by their path, e.g. ('full_script', 'act1') or ('character_matrix', 0, 'name').
+    """
+
+    def __init__(self):
+        self._stack = []  # [container, key_or_index, expecting_key] per open object/array
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._scalar = []
+        self.values = {}
+
+    def _path(self):
+        return tuple(frame[1] for frame in self._stack)
+
+    def _emit(self, value, completed):
+        path = self._path()
+        self.values[path] = value
+        completed.append((path, value))
+
+    def _flush_scalar(self, completed):
+        if not self._scalar:
+            return
+        token = "".join(self._scalar)
+        self._scalar = []
+        if not self._stack:
+            return  # Stray text outside the document, e.g. a ```json fence.
+        try:
+            self._emit(json.loads(token), completed)
+        except ValueError:
+            pass
+
+    def _finish_string(self, completed):
+        value = decode_string("".join(self._string))
+        self._string = []
+        if not self._stack:
+            return
+        frame = self._stack[-1]
+        if frame[0] == "object" and frame[2]:
+            frame[1] = value
+        else:
+            self._emit(value, completed)
+
+    def feed(self, text):
+        """Feeds the next piece of the document and returns the (path, value) pairs it completed."""
+        completed = []
+        for ch in text:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._finish_string(completed)
+                    continue
+                self._string.append(ch)
+                continue
+
+            if ch == '"':
+                self._flush_scalar(completed)
+                self._in_string = True
+            elif ch == "{":
+                self._flush_scalar(completed)
+                self._stack.append(["object", None, True])
+            elif ch == "[":
+                self._flush_scalar(completed)
+                self._stack.append(["array", 0, False])
+            elif ch in "}]":
+                self._flush_scalar(completed)
+                if self._stack:
+                    self._stack.pop()
+            elif ch == ":":
+                if self._stack:
+                    self._stack[-1][2] = False
+            elif ch == ",":
+                self._flush_scalar(completed)
+                if self._stack:
+                    frame = self._stack[-1]
+                    if frame[0] == "object":
+                        frame[1], frame[2] = None, True
+                    else:
+                        frame[1] += 1
+            elif ch.isspace():
+                self._flush_scalar(completed)
+            else:
+                self._scalar.append(ch)
+        return completed
@@ -0,0 +1,197 @@
+"""Local knowledge index of past research briefings, searched with BM25.
+
+Every successful research run is split into single facts that keep their cited
+URLs. Each fact is indexed under its own words plus its briefing's topic and
+section heading, because most facts never repeat the topic's name. Before a new
+search, facts from earlier briefings on related topics are retrieved and given
+to the model as already known, so the search only has to fill the gaps.
+Everything lives in one SQLite file; retrieval needs no network.
+"""
+
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from script_architect.condense import STOPWORDS, URL_PATTERN, clean_url, estimate_tokens, normalize_fact, split_units
+
+KNOWLEDGE_INDEX_PATH = os.environ.get(
+    "KNOWLEDGE_INDEX_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "script_architect", "knowledge.sqlite3")
+)
+KNOWLEDGE_INDEX_ENABLED = os.environ.get("KNOWLEDGE_INDEX", "1") != "0"
+KNOWLEDGE_MAX_AGE_DAYS = float(os.environ.get("KNOWLEDGE_MAX_AGE_DAYS", "30"))
+# Prior facts handed to a research prompt, in estimated tokens.
+KNOWLEDGE_PRIOR_TOKENS = int(os.environ.get("KNOWLEDGE_PRIOR_TOKENS", "800"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Facts scoring below this share of the best match are left out.
+RELATIVE_SCORE_FLOOR = 0.35
+
+
+def terms(text):
+    return [word for word in normalize_fact(text).split() if word.isdigit() or (word not in STOPWORDS and len(word) > 2)]
+
+
+class KnowledgeIndex:
+    """Facts from past briefings with an inverted index (term -> fact, term frequency) for BM25 ranking."""
+
+    def __init__(self, path, max_age_days=KNOWLEDGE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age = max_age_days * 24 * 3600
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS facts (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT UNIQUE NOT NULL,
+                    topic TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    urls TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS facts_created_at ON facts (created_at);
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    fact_id INTEGER NOT NULL,
+                    tf INTEGER NOT NULL,
+                    PRIMARY KEY (term, fact_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS postings_fact_id ON postings (fact_id);
+            """)
+        self.purge_expired()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add_briefing(self, topic, research):
+        """Indexes every fact of a briefing; a fact seen before is refreshed rather than duplicated. Returns the count added."""
+        now = time.time()
+        added = 0
+        with self._lock, self._connect() as conn:
+            for heading, unit in split_units(research):
+                key = normalize_fact(unit)
+                urls = [clean_url(url) for url in URL_PATTERN.findall(unit)]
+                text = " ".join(re.sub(r"\(\s*\)", "", URL_PATTERN.sub("", unit)).split()).lstrip("- ").strip()
+                # Removing URLs leaves "Warner Bros ." behind; same cleanup as condense_research.
+                text = re.sub(r"\s+([.,;:!?])", r"\1", text)
+                if not text or len(key.split()) < 3:
+                    continue
+                row = conn.execute("SELECT id FROM facts WHERE key = ?", (key,)).fetchone()
+                if row:
+                    conn.execute("UPDATE facts SET created_at = ? WHERE id = ?", (now, row[0]))
+                    continue
+                document = terms(text) + terms(topic) + terms(heading or "")
+                cursor = conn.execute(
+                    "INSERT INTO facts (key, topic, text, urls, length, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, topic, text, json.dumps(urls), len(document), now)
+                )
+                frequencies = {}
+                for term in document:
+                    frequencies[term] = frequencies.get(term, 0) + 1
+                conn.executemany(
+                    "INSERT INTO postings (term, fact_id, tf) VALUES (?, ?, ?)",
+                    [(term, cursor.lastrowid, tf) for term, tf in frequencies.items()]
+                )
+                added += 1
+        self.purge_expired()
+        return added
+
+    def search(self, query, limit=20):
+        """Returns up to limit facts ranked by BM25 against query, best first, as dicts with a score."""
+        query_terms = sorted(set(terms(query)))
+        if not query_terms:
+            return []
+        cutoff = time.time() - self.max_age
+        with self._connect() as conn:
+            count, average_length = conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM facts WHERE created_at > ?", (cutoff,)
+            ).fetchone()
+            if not count:
+                return []
+            marks = ",".join("?" * len(query_terms))
+            postings = conn.execute(
+                f"SELECT p.term, p.fact_id, p.tf, f.length FROM postings p JOIN facts f ON f.id = p.fact_id "
+                f"WHERE p.term IN ({marks}) AND f.created_at > ?",
+                (*query_terms, cutoff)
+            ).fetchall()
+
+            frequency = {}
+            for term, *_ in postings:
+                frequency[term] = frequency.get(term, 0) + 1
+            scores = {}
+            matched = {}
+            for term, fact_id, tf, length in postings:
+                idf = math.log(1 + (count - frequency[term] + 0.5) / (frequency[term] + 0.5))
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+                scores[fact_id] = scores.get(fact_id, 0.0) + idf * norm
+                matched[fact_id] = matched.get(fact_id, 0) + 1
+
+            # A related topic shares most of the query's terms, not just one common word.
+            needed = math.ceil(len(query_terms) / 2)
+            ranked = sorted((fact_id for fact_id in scores if matched[fact_id] >= needed), key=scores.get, reverse=True)
+            if not ranked:
+                return []
+            floor = scores[ranked[0]] * RELATIVE_SCORE_FLOOR
+            ranked = [fact_id for fact_id in ranked if scores[fact_id] >= floor][:limit]
+            rows = {
+                row[0]: row for row in conn.execute(
+                    f"SELECT id, topic, text, urls, created_at FROM facts WHERE id IN ({','.join('?' * len(ranked))})",
+                    ranked
+                )
+            }
+        return [
+            {"topic": rows[fact_id][1], "text": rows[fact_id][2], "urls": json.loads(rows[fact_id][3]),
+             "created_at": rows[fact_id][4], "score": scores[fact_id]}
+            for fact_id in ranked
+        ]
+
+    def prior_facts(self, topic, budget=KNOWLEDGE_PRIOR_TOKENS):
+        """The best-matching earlier facts for topic, formatted as a bullet list within budget tokens ("" if none).
+
+        Facts from earlier briefings on this same topic are left out: they would
+        change the prompt of a repeated search and defeat the response cache,
+        which already answers a repeat without a new request.
+        """
+        lines = []
+        used = 0
+        own_topic = normalize_fact(topic)
+        for fact in self.search(topic):
+            if normalize_fact(fact["topic"]) == own_topic:
+                continue
+            line = f"- {fact['text']}" + "".join(f" ({url})" for url in fact["urls"][:2])
+            if used + estimate_tokens(line) > budget:
+                break
+            lines.append(line)
+            used += estimate_tokens(line)
+        return "\n".join(lines)
+
+    def purge_expired(self):
+        cutoff = time.time() - self.max_age
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM postings WHERE fact_id IN (SELECT id FROM facts WHERE created_at <= ?)", (cutoff,))
+            conn.execute("DELETE FROM facts WHERE created_at <= ?", (cutoff,))
+
+    def stats(self):
+        with self._connect() as conn:
+            facts, topics = conn.execute("SELECT COUNT(*), COUNT(DISTINCT topic) FROM facts").fetchone()
+            terms_count = conn.execute("SELECT COUNT(DISTINCT term) FROM postings").fetchone()[0]
+        return {"facts": facts, "topics": topics, "terms": terms_count}
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_knowledge_index():
+    """Returns the process-wide KnowledgeIndex, opening it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = KnowledgeIndex(KNOWLEDGE_INDEX_PATH)
+        return _index
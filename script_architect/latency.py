@@ -0,0 +1,179 @@
+"""Latency-aware request execution: adaptive timeouts and hedged requests.
+
+Observed latencies are kept per key (call type, plus whether it measures a whole
+response or the first streamed chunk). Once a key has enough samples its timeout
+follows its p99 instead of a fixed value. Hedging sends a duplicate request when
+the first has not answered by the key's p95, keeps whichever answers first and
+cancels the other. That caps tail latency at about 5% extra requests.
+
+Attempts that time out or are cancelled (a losing hedge) are recorded too, as
+censored samples: the time they had run, which their real latency exceeds.
+Dropping them would bias the percentiles low and let a timeout that keeps
+firing only ever shrink; with them, each timeout widens the next one.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 10
+ADAPTIVE_TIMEOUT_FACTOR = 1.5
+ADAPTIVE_TIMEOUT_MIN = 10.0
+ADAPTIVE_TIMEOUT_MAX = 120.0
+GEMINI_HEDGE = os.environ.get("GEMINI_HEDGE", "1") != "0"
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class LatencyTracker:
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._hedges = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key, q):
+        """The q-quantile of key's recent latencies, or None until there are enough samples."""
+        with self._lock:
+            samples = list(self._samples.get(key, ()))
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+        return percentile(samples, q)
+
+    def timeout(self, key, default):
+        p99 = self.percentile(key, 0.99)
+        if p99 is None:
+            return default
+        return min(max(p99 * ADAPTIVE_TIMEOUT_FACTOR, ADAPTIVE_TIMEOUT_MIN), ADAPTIVE_TIMEOUT_MAX)
+
+    def _count_hedge(self, key, won):
+        with self._lock:
+            counts = self._hedges.setdefault(key, [0, 0])
+            counts[0] += 1
+            counts[1] += int(won)
+
+    async def call(self, key, make_coro, hedge=False, can_hedge=None):
+        """Awaits make_coro(), racing a duplicate after key's p95 when hedge is set.
+
+        can_hedge() is asked right before the duplicate is sent and may veto it.
+        """
+        async def timed():
+            started = time.monotonic()
+            try:
+                result = await make_coro()
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                self.record(key, time.monotonic() - started)
+                raise
+            self.record(key, time.monotonic() - started)
+            return result
+
+        delay = self.percentile(key, 0.95) if hedge else None
+        primary = asyncio.ensure_future(timed())
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or (can_hedge is not None and not can_hedge()):
+            return await primary
+
+        backup = asyncio.ensure_future(timed())
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self._count_hedge(key, won=task is backup)
+                        return task.result()
+                    error = task.exception()
+            self._count_hedge(key, won=False)
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, key, make_stream, hedge=False, can_hedge=None):
+        """Yields from make_stream(); when hedging, the first copy to produce a chunk wins.
+
+        The recorded latency is the time to the first chunk.
+        """
+        delay = self.percentile(key, 0.95) if hedge else None
+        streams = {}
+
+        def start():
+            generator = make_stream()
+            streams[asyncio.ensure_future(generator.__anext__())] = (generator, time.monotonic())
+
+        start()
+        primary = next(iter(streams))
+        if delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done and (can_hedge is None or can_hedge()):
+                start()
+
+        winner = None
+        error = None
+        try:
+            pending = set(streams)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None or isinstance(task.exception(), StopAsyncIteration):
+                        winner = task
+                        break
+                    error = task.exception()
+        finally:
+            for task, (generator, started) in streams.items():
+                if task is not winner:
+                    if not task.done() or task.cancelled() or isinstance(task.exception(), asyncio.TimeoutError):
+                        # Censored: this copy's first chunk would have taken at least this long.
+                        self.record(key, time.monotonic() - started)
+                    task.cancel()
+                    await asyncio.gather(task, return_exceptions=True)
+                    await generator.aclose()
+        if len(streams) > 1:
+            self._count_hedge(key, won=winner is not None and winner is not primary)
+        if winner is None:
+            raise error
+
+        generator, started = streams[winner]
+        if isinstance(winner.exception(), StopAsyncIteration):
+            return
+        self.record(key, time.monotonic() - started)
+        yield winner.result()
+        async for item in generator:
+            yield item
+
+    def stats(self):
+        with self._lock:
+            keys = sorted(set(self._samples) | set(self._hedges))
+            samples = {key: list(self._samples.get(key, ())) for key in keys}
+            hedges = {key: tuple(self._hedges.get(key, (0, 0))) for key in keys}
+        return {
+            key: {
+                "count": len(samples[key]),
+                "p50_s": percentile(samples[key], 0.5) if samples[key] else None,
+                "p95_s": percentile(samples[key], 0.95) if samples[key] else None,
+                "hedged": hedges[key][0],
+                "hedge_wins": hedges[key][1],
+            }
+            for key in keys
+        }
+
+
+_tracker = LatencyTracker()
+
+
+def get_latency_tracker():
+    """Returns the process-wide LatencyTracker shared by every session."""
+    return _tracker
@@ -0,0 +1,165 @@
+"""Persistent Gemini response cache with single-flight de-duplication of identical in-flight calls."""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+LLM_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "script_architect", "llm_cache.sqlite3")
+)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE", "1") != "0"
+
+# Grounded search results go stale quickly; generated packages stay valid for their inputs.
+CALL_TYPE_TTLS = {
+    "research": 6 * 3600,
+    "research_facet": 6 * 3600,
+    "script": 7 * 24 * 3600,
+    "bundle": 7 * 24 * 3600,
+    "default": 24 * 3600,
+}
+
+
+class LLMCache:
+    """SQLite-backed response cache keyed on everything that determines a Gemini response."""
+
+    def __init__(self, path, ttls=None):
+        self.path = path
+        self.ttls = dict(CALL_TYPE_TTLS, **(ttls or {}))
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._followers = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    call_type TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at)")
+        self.purge_expired()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(model, system_instruction, prompt, tools, is_json):
+        material = json.dumps([model, system_instruction or "", prompt, tools or [], bool(is_json)], sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, call_type, response):
+        now = time.time()
+        ttl = self.ttls.get(call_type, self.ttls["default"])
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, call_type, response, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, call_type, response, now, now + ttl)
+            )
+        with self._lock:
+            self._puts += 1
+            purge = self._puts % 50 == 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+
+    async def fetch_async(self, key, call_type, compute, refresh=False):
+        """Returns (response, computed_here); compute() returns an awaitable.
+
+        A cached response is returned unless refresh is set. Otherwise the first
+        caller for a key runs compute() while identical concurrent callers wait for
+        and share its result. Error responses are shared but never stored. SQLite
+        access runs in a worker thread to keep the loop responsive.
+        """
+        if not refresh:
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None:
+                with self._lock:
+                    self.hits += 1
+                return cached, False
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+                self._followers[key] = self._followers.get(key, 0) + 1
+        if not leader:
+            return await asyncio.wrap_future(future), False
+
+        # A cancelled caller must not abort a call others are sharing; that one finishes and is cached.
+        task = asyncio.ensure_future(self._compute_shared(key, call_type, compute, future))
+        try:
+            return await asyncio.shield(task), True
+        except asyncio.CancelledError:
+            with self._lock:
+                abandoned = not self._followers.get(key)
+                if abandoned:
+                    # Later callers start afresh instead of joining a call that is being cancelled.
+                    self._inflight.pop(key, None)
+            if abandoned:
+                task.cancel()
+            raise
+
+    async def _compute_shared(self, key, call_type, compute, future):
+        try:
+            response = await compute()
+            if response and not response.startswith("Error:"):
+                await asyncio.to_thread(self.put, key, call_type, response)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+                    self._followers.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """Returns the process-wide LLMCache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMCache(LLM_CACHE_PATH)
+        return _cache
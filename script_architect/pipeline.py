@@ -0,0 +1,616 @@
+"""The content pipeline: grounded research, script synthesis and the YouTube bundle."""
+
+import asyncio
+import copy
+import json
+import logging
+
+from script_architect.condense import URL_PATTERN, clean_url, condense_research, estimate_tokens, normalize_fact
+from script_architect.gemini import call_gemini, call_gemini_async
+from script_architect.json_repair import NUMBER, fill_defaults, merge_fields, repair_json, schema_template, validate, without_fields
+from script_architect.jsonstream import IncrementalJSONParser
+from script_architect.knowledge import KNOWLEDGE_INDEX_ENABLED, get_knowledge_index
+from script_architect.runtime import get_runtime
+from script_architect.telemetry import annotate, mark_failed, span, traced
+
+logger = logging.getLogger(__name__)
+
+CONTENT_MODES = ["Film & Series Analysis", "Tech News & Investigative", "Educational Technology"]
+VIDEO_LENGTHS = [
+    "YouTube Short (< 1 minute)",
+    "Mid-length (3-8 mins)",
+    "Deep Dive (10+ mins)"
+]
+SOURCE_TYPES = ["Original", "Book", "Comic", "True Event", "Remake"]
+DEEP_DIVE = VIDEO_LENGTHS[2]
+SCRIPT_SECTIONS = [
+    ("intro", "Intro"),
+    ("act1", "Act 1"),
+    ("act2", "Act 2"),
+    ("act3", "Act 3"),
+    ("outro", "Outro"),
+]
+# Sections that can be regenerated on their own, in narration order.
+EDITABLE_SECTIONS = [("hook", "Hook")] + SCRIPT_SECTIONS
+
+
+# Focused sub-queries for fan-out research: (heading, what that search should dig up).
+RESEARCH_FACETS = [
+    ("Dates & Facts", "Hard facts only: exact dates, names, figures, versions, credits and official or company statements."),
+    ("Reception & Reaction", "How critics, audiences, users and the industry reacted: reviews, scores, box office or market numbers, controversy."),
+    ("Parallels & Context", "Historical parallels, comparable works or incidents, and the wider context that makes the angle stronger."),
+]
+RESEARCH_SYSTEM_INSTRUCTION = "You are an expert Research Assistant. Always search the web for current, accurate information. Your goal is to fact-check and find data that supports the Creator's Angle."
+
+
+def record_stage_result(result):
+    """Notes a stage's output on its span; "Error: ..." strings and error dicts mark it failed. Returns result."""
+    if isinstance(result, dict) and "error" in result:
+        mark_failed(result["error"])
+    elif isinstance(result, str):
+        annotate(output_chars=len(result))
+        if result.startswith("Error:"):
+            mark_failed(result)
+    return result
+
+
+def prior_research_block(prior):
+    if not prior:
+        return ""
+    return f"""
+    PRIOR RESEARCH (facts from earlier briefings on related topics; treat them as already known):
+{prior}
+
+    Do not search for or repeat the prior research above. Search only for what it does not cover, and for anything that may have changed since.
+    """
+
+
+def finish_research(topic, findings, prior, on_chunk=None):
+    """Adds fresh findings to the knowledge index and appends the prior facts the search was told to skip."""
+    if findings.startswith("Error:"):
+        return findings
+    if KNOWLEDGE_INDEX_ENABLED:
+        annotate(indexed_facts=get_knowledge_index().add_briefing(topic, findings))
+    if not prior:
+        return findings
+    section = f"\n\n## Prior Research (from earlier briefings)\n{prior}"
+    if on_chunk:
+        on_chunk(section)
+    return findings + section
+
+
+@traced("research")
+def perform_grounded_research(topic, mode, source_type, angle, length, api_key, on_chunk=None, refresh_cache=False, fan_out=None, reuse_knowledge=True):
+    """Executes targeted research based on the user's angle and parameters.
+
+    fan_out defaults to on for Deep Dives, where several focused searches run in
+    parallel instead of one long generation. With reuse_knowledge, facts from
+    earlier briefings on related topics are given to the search as known, so it
+    only fills the gaps, and are appended to the briefing it returns.
+    """
+    if fan_out is None:
+        fan_out = length == DEEP_DIVE
+    prior = get_knowledge_index().prior_facts(topic) if reuse_knowledge and KNOWLEDGE_INDEX_ENABLED else ""
+    annotate(length=length, fan_out=fan_out, prior_facts=len(prior.splitlines()), prior_tokens=estimate_tokens(prior))
+    if fan_out:
+        findings = perform_fanout_research(topic, mode, source_type, angle, length, api_key, on_chunk, refresh_cache,
+                                           prior=prior)
+        return record_stage_result(finish_research(topic, findings, prior, on_chunk))
+
+    system_instruction = RESEARCH_SYSTEM_INSTRUCTION
+    
+    prompt = f"""
+    TOPIC: {topic}
+    SOURCE TYPE: {source_type}
+    VIDEO LENGTH: {length}
+    CREATOR'S ANGLE / DRAFT: {angle}
+    
+    TASK: Execute targeted web searches to gather factual context that specifically supports, verifies, or fills the gaps in the "CREATOR'S ANGLE". 
+    
+    INSTRUCTIONS:
+    1. Do not just summarize the topic. Actively look for data, recent news, or historical parallels that make the Creator's Angle stronger.
+    2. If the Creator's Angle is missing specific facts (like exact dates, character names, technology versions, or company statements), find them.
+    3. If the Video Length is "Deep Dive (10+ mins)", gather extensive details and multiple perspectives.
+    4. Provide your findings as a factual briefing. Cite your sources with URLs.
+    {prior_research_block(prior)}"""
+    findings = call_gemini(api_key, prompt, system_instruction, use_search=True, on_chunk=on_chunk,
+                           call_type="research", refresh_cache=refresh_cache)
+    return record_stage_result(finish_research(topic, findings, prior, on_chunk))
+
+
+def perform_fanout_research(topic, mode, source_type, angle, length, api_key, on_chunk=None, refresh_cache=False, facets=RESEARCH_FACETS, prior=""):
+    """Runs one focused grounded search per facet concurrently on the shared runtime and merges them into one briefing.
+
+    on_chunk receives each facet's findings as it completes, always on the calling thread.
+    prior is the known-facts list each facet search is told not to repeat.
+    """
+    def facet_prompt(heading, focus):
+        return f"""
+    TOPIC: {topic}
+    CONTENT MODE: {mode}
+    SOURCE TYPE: {source_type}
+    CREATOR'S ANGLE / DRAFT: {angle}
+
+    TASK: Execute targeted web searches for ONE research facet: {heading}.
+    FOCUS: {focus}
+
+    INSTRUCTIONS:
+    1. Stay strictly within this facet; other facets are researched separately.
+    2. Prefer specific, verifiable facts that support or fill gaps in the Creator's Angle.
+    3. Write concise bullet points, one fact per bullet, each citing its source URL.
+    {prior_research_block(prior)}"""
+
+    async def research_facets(emit):
+        async def research_facet(heading, focus):
+            with span("research.facet", facet=heading):
+                findings = await call_gemini_async(api_key, facet_prompt(heading, focus), RESEARCH_SYSTEM_INSTRUCTION,
+                                                   use_search=True, call_type="research_facet",
+                                                   refresh_cache=refresh_cache)
+                record_stage_result(findings)
+            if not findings.startswith("Error:"):
+                emit(f"### {heading}\n{findings}\n\n")
+            return findings
+
+        return await asyncio.gather(*(research_facet(heading, focus) for heading, focus in facets))
+
+    results = get_runtime().run_with_events(research_facets, on_chunk)
+    findings = {heading: result for (heading, _), result in zip(facets, results)}
+
+    sections = [(heading, findings[heading]) for heading, _ in facets if not findings[heading].startswith("Error:")]
+    if not sections:
+        return findings[facets[0][0]]
+    return merge_research_briefings(sections)
+
+
+def merge_research_briefings(sections):
+    """Merges (heading, briefing) pairs into one briefing with repeated facts dropped and URLs pooled."""
+    seen_facts = set()
+    urls = []
+    merged = []
+    for heading, text in sections:
+        kept = []
+        for line in text.splitlines():
+            for url in URL_PATTERN.findall(line):
+                url = clean_url(url)
+                if url.rstrip("/") not in (known.rstrip("/") for known in urls):
+                    urls.append(url)
+            fact = normalize_fact(line)
+            if not fact:
+                continue
+            if fact in seen_facts:
+                continue
+            seen_facts.add(fact)
+            kept.append(line.rstrip())
+        if kept:
+            merged.append(f"## {heading}\n" + "\n".join(kept))
+    if urls:
+        merged.append("## Sources\n" + "\n".join(f"{index}. {url}" for index, url in enumerate(urls, start=1)))
+    return "\n\n".join(merged)
+
+
+SCRIPT_PERSONAS = {
+    "Film & Series Analysis": "Master YouTube Film Critic. Focus on narrative, character arcs, and thematic depth.",
+    "Tech News & Investigative": "Investigative Tech YouTuber. Focus on clarity, impact, and engaging storytelling.",
+    "Educational Technology": "Senior Developer turned YouTuber. Explain things naturally, like a mentor talking to a junior."
+}
+SCRIPT_PACKAGE_SCHEMA = {
+    "thematic_resonance": {"real_world_event": str, "explanation": str},
+    "character_matrix": [{"name": str, "role": str, "arc_score": NUMBER, "ghost_vs_truth": str}],
+    "technical_report": {"script": NUMBER, "direction": NUMBER, "editing": NUMBER, "acting": NUMBER},
+    "viral_title": str,
+    "hook_script": str,
+    "full_script": {key: str for key, _ in SCRIPT_SECTIONS},
+    "script_outline": [str],
+    "seo_metadata": {"description": str, "tags": [str]},
+}
+BUNDLE_SCHEMA = {
+    "viral_title": str,
+    "description": str,
+    "tags": [str],
+    "hashtags": [str],
+    "thumbnail_prompt": str,
+}
+PACKAGING_SYSTEM_INSTRUCTION = "You are a master YouTube strategist and SEO expert."
+# Packaging fields we A/B test; one request returns several candidates for each.
+VARIANT_FIELDS = [
+    ("viral_title", "Title"),
+    ("hook_script", "Hook"),
+    ("thumbnail_prompt", "Thumbnail prompt"),
+]
+VARIANTS_SCHEMA = {key: [str] for key, _ in VARIANT_FIELDS}
+# Without these a response is not worth showing. Any other field still invalid after the
+# targeted retry comes back empty and is listed under "unresolved" instead of failing the call.
+SCRIPT_ESSENTIAL_FIELDS = ["viral_title", "hook_script", "full_script"]
+BUNDLE_ESSENTIAL_FIELDS = ["viral_title"]
+DEFAULT_VARIANT_COUNT = 3
+# Research token budgets per target length for the condensation stage.
+RESEARCH_TOKEN_BUDGETS = {
+    VIDEO_LENGTHS[0]: 600,
+    VIDEO_LENGTHS[1]: 1500,
+    VIDEO_LENGTHS[2]: 3500,
+}
+
+
+# The static heads of the script and bundle prompts. They are identical on every call and come
+# before anything per-call, so requests share as long a prefix as possible and Gemini's implicit
+# prefix caching can bill and prefill the shared part at the cached rate. Keep new per-call
+# content out of them.
+SCRIPT_PROMPT_PREFIX = """
+    TASK: You are a professional, conversational YouTube scriptwriter. Your goal is to refine the "CREATOR'S DRAFT" in the brief below into a highly engaging, human-sounding script ready for voiceover.
+    
+    CRITICAL INSTRUCTIONS:
+    1. LENGTH ADAPTATION: Write for the "VIDEO LENGTH" given in the brief.
+       - If it is a YouTube Short, make the script extremely punchy, fast-paced, and under 150 words total.
+       - If it is Mid-length or Deep Dive, flesh out the arguments with natural pacing.
+    2. HUMAN TONE: The script MUST sound like a real person talking to a camera. Use conversational phrasing, rhetorical questions, and natural transitions. AVOID robotic listicles.
+    3. ANGLE-FIRST REFINEMENT: Preserve the creator's unique perspective. Only use the "TARGETED RESEARCH" to factually support their points. Do NOT dump all the research into the script.
+    4. ALIGNMENT: Match the tone indicated in the "SELECTED MATRIX".
+    5. ESCAPE CHARACTERS: Ensure ALL double quotes inside your script text are properly escaped (e.g., \\"Like this\\") so the JSON remains completely valid.
+    
+    JSON SCHEMA REQUIREMENTS:
+    {
+      "thematic_resonance": { "real_world_event": "String", "explanation": "Detailed parallel based on angle" },
+      "character_matrix": [ { "name": "Name", "role": "Main/Side", "arc_score": 0, "ghost_vs_truth": "String" } ],
+      "technical_report": { "script": 0, "direction": 0, "editing": 0, "acting": 0 },
+      "viral_title": "String (Catchy YouTube Title)",
+      "hook_script": "String (A punchy, conversational opening hook)",
+      "full_script": { 
+          "intro": "Conversational intro flowing from the hook.",
+          "act1": "Conversational Act 1.",
+          "act2": "Conversational Act 2.",
+          "act3": "Conversational Act 3.",
+          "outro": "Natural conclusion and call-to-action."
+      },
+      "script_outline": ["Brief point 1", "Brief point 2", "Brief point 3"],
+      "seo_metadata": { "description": "String", "tags": ["tag1", "tag2"] }
+    }
+    
+    BRIEF:"""
+BUNDLE_PROMPT_PREFIX = """
+    Analyze the YouTube script below and create a complete SEO and packaging bundle.
+    
+    JSON SCHEMA REQUIREMENTS:
+    {
+        "viral_title": "String (A high-CTR, emotional, and catchy YouTube title)",
+        "description": "String (A full YouTube description including a hook, summary, and placeholder for social links)",
+        "tags": ["tag1", "tag2", "tag3", "etc (Generate 15 highly relevant SEO tags)"],
+        "hashtags": ["#tag1", "#tag2", "#tag3 (Generate 3-5 highly relevant hashtags)"],
+        "thumbnail_prompt": "String (A highly detailed, visual prompt for an AI image generator to create a catchy, high-contrast, professional YouTube thumbnail. Specify lighting, subjects, and mood.)"
+    }
+    
+    SCRIPT:"""
+
+
+def build_script_prompt(topic, research, angle, matrix, source_type, length):
+    """SCRIPT_PROMPT_PREFIX followed by the per-call brief."""
+    return SCRIPT_PROMPT_PREFIX + f"""
+    TOPIC: {topic}
+    SOURCE TYPE: {source_type}
+    VIDEO LENGTH: {length}
+    CREATOR'S DRAFT / UNIQUE ANGLE: {angle}
+    SELECTED MATRIX (Tone/Style): {matrix}
+    TARGETED RESEARCH: {research}
+    """
+
+
+@traced("condense")
+def condense_research_for_script(topic, research, angle, matrix, source_type, length):
+    """Condensation stage between research and synthesis.
+
+    Deduplicates the briefing and compresses it to the token budget for the
+    video length. Returns (condensed_research, stats); stats also carries the
+    estimated script prompt size before and after.
+    """
+    budget = RESEARCH_TOKEN_BUDGETS.get(length, RESEARCH_TOKEN_BUDGETS[VIDEO_LENGTHS[1]])
+    condensed, stats = condense_research(research, budget, focus=f"{topic} {angle}")
+    stats["prompt_tokens_before"] = estimate_tokens(build_script_prompt(topic, research, angle, matrix, source_type, length))
+    stats["prompt_tokens_after"] = estimate_tokens(build_script_prompt(topic, condensed, angle, matrix, source_type, length))
+    logger.info(
+        "Script prompt for %r: ~%d -> ~%d tokens (research ~%d -> ~%d, budget %d; %d duplicate facts, %d duplicate URLs, %d facts over budget)",
+        topic, stats["prompt_tokens_before"], stats["prompt_tokens_after"], stats["tokens_before"], stats["tokens_after"],
+        budget, stats["duplicate_facts"], stats["duplicate_urls"], stats["dropped_for_budget"]
+    )
+    annotate(**{key: stats[key] for key in ("tokens_before", "tokens_after", "prompt_tokens_before", "prompt_tokens_after")})
+    return condensed, stats
+
+
+def build_field_repair_prompt(brief, fields, partial, schema):
+    return f"""
+    {brief.strip()}
+
+    Your previous JSON response was missing or had invalid values for these fields: {", ".join(fields)}.
+    These fields are already final and are shown only for context (do not repeat them):
+    {json.dumps(partial, ensure_ascii=False)}
+
+    TASK: Return ONLY a JSON object containing exactly the listed fields, following this schema:
+    {json.dumps(schema_template(schema, fields), indent=2)}
+    Ensure ALL double quotes inside your text are properly escaped so the JSON remains completely valid.
+    """
+
+
+def complete_json_response(result, schema, rerequest):
+    """Parses a JSON response tolerantly and re-requests only the fields that could not be salvaged.
+
+    rerequest(fields, partial) must return the raw text of a follow-up response.
+    Returns (obj, report); obj is None when nothing could be salvaged. An error
+    result, or JSON without a single schema field (e.g. an API error body), is
+    never completed field by field: that would be a full generation in disguise.
+    """
+    if not result or result.startswith("Error:"):
+        return None, {"method": "error", "rerequested": [], "unresolved": []}
+    obj, method = repair_json(result)
+    report = {"method": method, "rerequested": [], "unresolved": []}
+    if obj is None or not any(key in obj for key in schema):
+        return None, report
+    problems = validate(obj, schema)
+    if problems:
+        report["rerequested"] = problems
+        patch, _ = repair_json(rerequest(problems, without_fields(obj, problems)))
+        if patch:
+            merge_fields(obj, patch, problems)
+        problems = validate(obj, schema)
+    report["unresolved"] = problems
+    if method != "strict" or report["rerequested"]:
+        logger.info("JSON response parsed via %s; re-requested %s; unresolved %s",
+                    method, report["rerequested"] or "nothing", problems or "nothing")
+    return obj, report
+
+
+def missing_essentials(schema, unresolved, essential):
+    """Essential fields with nothing usable: unresolved themselves or, for an object, in every member."""
+    missing = []
+    for field in essential:
+        spec = schema[field]
+        members = [f"{field}.{key}" for key in spec] if isinstance(spec, dict) else [field]
+        if all(member in unresolved for member in members):
+            missing.append(field)
+    return missing
+
+
+def json_failure(message, result, missing):
+    """Builds the error dict the UI shows, with the raw response for debugging."""
+    if result and result.startswith("Error:"):
+        message = f"{message} {result}"
+    elif missing:
+        message = f"{message} Still invalid after a targeted retry: {', '.join(missing)}"
+    return {"error": message, "raw": result}
+
+
+def settle_json_response(message, result, obj, report, schema, essential):
+    """Returns the completed obj, or an error dict if nothing was salvaged or an essential field is unusable.
+
+    Fields that are still invalid are set to empty values and their paths listed
+    under obj["unresolved"], so the UI and batch can warn about them.
+    """
+    missing = missing_essentials(schema, report["unresolved"], essential) if obj is not None else []
+    if obj is None or missing:
+        return record_stage_result(json_failure(message, result, missing))
+    if report["unresolved"]:
+        fill_defaults(obj, schema, report["unresolved"])
+        obj["unresolved"] = report["unresolved"]
+        annotate(unresolved_fields=len(report["unresolved"]))
+    return obj
+
+
+@traced("script")
+def generate_script_package(mode, topic, research, angle, matrix, source_type, length, api_key, on_field=None, refresh_cache=False):
+    """Synthesizes the script package. With on_field, the response is streamed and
+    on_field(path, value) fires as soon as each JSON field is complete."""
+    prompt = build_script_prompt(topic, research, angle, matrix, source_type, length)
+
+    on_chunk = None
+    if on_field is not None:
+        parser = IncrementalJSONParser()
+
+        def on_chunk(delta):
+            for path, value in parser.feed(delta):
+                on_field(path, value)
+
+    result = call_gemini(api_key, prompt, SCRIPT_PERSONAS.get(mode), is_json=True, on_chunk=on_chunk,
+                         call_type="script", refresh_cache=refresh_cache)
+
+    def rerequest(fields, partial):
+        brief = f"""
+    TOPIC: {topic}
+    SOURCE TYPE: {source_type}
+    VIDEO LENGTH: {length}
+    CREATOR'S DRAFT / UNIQUE ANGLE: {angle}
+    SELECTED MATRIX (Tone/Style): {matrix}
+    You are completing a conversational YouTube script package for this brief."""
+        return call_gemini(api_key, build_field_repair_prompt(brief, fields, partial, SCRIPT_PACKAGE_SCHEMA),
+                           SCRIPT_PERSONAS.get(mode), is_json=True, call_type="script", refresh_cache=refresh_cache)
+
+    package, report = complete_json_response(result, SCRIPT_PACKAGE_SCHEMA, rerequest)
+    annotate(streamed=on_field is not None, json_parse=report["method"], rerequested_fields=len(report["rerequested"]))
+    return settle_json_response("Synthesis failed to return valid JSON.", result, package, report,
+                                SCRIPT_PACKAGE_SCHEMA, SCRIPT_ESSENTIAL_FIELDS)
+
+
+@traced("bundle")
+def generate_youtube_bundle(api_key, script_text, refresh_cache=False):
+    prompt = BUNDLE_PROMPT_PREFIX + f"""
+    {script_text}
+    """
+    system_instruction = PACKAGING_SYSTEM_INSTRUCTION
+    result = call_gemini(api_key, prompt, system_instruction, is_json=True,
+                         call_type="bundle", refresh_cache=refresh_cache)
+
+    def rerequest(fields, partial):
+        brief = f"""
+    Complete the SEO and packaging bundle for the following YouTube script.
+
+    SCRIPT:
+    {script_text}"""
+        return call_gemini(api_key, build_field_repair_prompt(brief, fields, partial, BUNDLE_SCHEMA),
+                           system_instruction, is_json=True, call_type="bundle", refresh_cache=refresh_cache)
+
+    bundle, report = complete_json_response(result, BUNDLE_SCHEMA, rerequest)
+    annotate(json_parse=report["method"], rerequested_fields=len(report["rerequested"]))
+    return settle_json_response("Failed to generate bundle.", result, bundle, report, BUNDLE_SCHEMA, BUNDLE_ESSENTIAL_FIELDS)
+
+
+def build_variants_prompt(topic, angle, matrix, length, script_text, current, count):
+    return f"""
+    TOPIC: {topic}
+    VIDEO LENGTH: {length}
+    CREATOR'S DRAFT / UNIQUE ANGLE: {angle}
+    SELECTED MATRIX (Tone/Style): {matrix}
+
+    SCRIPT:
+    {script_text}
+
+    CURRENT TITLE: {current.get("viral_title") or "(none)"}
+    CURRENT HOOK: {current.get("hook_script") or "(none)"}
+    CURRENT THUMBNAIL PROMPT: {current.get("thumbnail_prompt") or "(none)"}
+
+    TASK: We are A/B testing this video's packaging. Write {count} candidates for each of the YouTube title, the spoken opening hook and the thumbnail image prompt.
+
+    INSTRUCTIONS:
+    1. Every candidate must take a clearly different approach (curiosity gap, bold claim, direct question, personal stake, surprising number...). Do not just reword another candidate or the current version.
+    2. Hooks are spoken to camera: punchy, conversational, and leading naturally into the script's intro.
+    3. Thumbnail prompts are detailed visual prompts for an AI image generator: subjects, lighting, mood and high contrast.
+    4. Ensure ALL double quotes inside your text are properly escaped so the JSON remains completely valid.
+
+    JSON SCHEMA REQUIREMENTS (each array holds exactly {count} strings):
+    {{
+        "viral_title": ["String", "..."],
+        "hook_script": ["String", "..."],
+        "thumbnail_prompt": ["String", "..."]
+    }}
+    """
+
+
+@traced("variants")
+def generate_packaging_variants(topic, angle, matrix, length, script_text, api_key, current=None, count=DEFAULT_VARIANT_COUNT, refresh_cache=True):
+    """Asks for count candidates of every VARIANT_FIELDS field in one JSON request.
+
+    current holds the title/hook/thumbnail prompt already in use, so the
+    candidates are alternatives to it. Returns {field: [candidates]} with
+    repeats dropped, or an error dict. A field that still failed after the
+    targeted retry offers only its current value and is listed under
+    "unresolved". Like a section regeneration, asking again
+    should give fresh candidates, so the response cache is bypassed by default.
+    """
+    prompt = build_variants_prompt(topic, angle, matrix, length, script_text, current or {}, count)
+    result = call_gemini(api_key, prompt, PACKAGING_SYSTEM_INSTRUCTION, is_json=True,
+                         call_type="bundle", refresh_cache=refresh_cache)
+
+    def rerequest(fields, partial):
+        brief = f"""
+    Write {count} alternative candidates per field for the packaging of this YouTube script about {topic}.
+
+    SCRIPT:
+    {script_text}"""
+        return call_gemini(api_key, build_field_repair_prompt(brief, fields, partial, VARIANTS_SCHEMA),
+                           PACKAGING_SYSTEM_INSTRUCTION, is_json=True, call_type="bundle", refresh_cache=refresh_cache)
+
+    obj, report = complete_json_response(result, VARIANTS_SCHEMA, rerequest)
+    # A field already in use can fall back to its current value; one without can't be offered at all.
+    current = current or {}
+    essential = [key for key, _ in VARIANT_FIELDS if not current.get(key)]
+    obj = settle_json_response("Failed to generate variants.", result, obj, report, VARIANTS_SCHEMA, essential)
+    if "error" in obj:
+        return obj
+
+    variants = {}
+    for key, _ in VARIANT_FIELDS:
+        seen = set()
+        variants[key] = []
+        for candidate in obj[key]:
+            candidate = candidate.strip()
+            if candidate and normalize_fact(candidate) not in seen:
+                seen.add(normalize_fact(candidate))
+                variants[key].append(candidate)
+        variants[key] = variants[key][:count] or ([current[key]] if current.get(key) else [])
+    annotate(requested=count, returned=min(len(variants[key]) for key, _ in VARIANT_FIELDS))
+    empty = [key for key, _ in VARIANT_FIELDS if not variants[key]]
+    if empty:
+        return record_stage_result({"error": f"Failed to generate variants. No candidates for: {', '.join(empty)}", "raw": result})
+    if "unresolved" in obj:
+        variants["unresolved"] = obj["unresolved"]
+    return variants
+
+
+def assemble_script_text(package):
+    """Joins the hook and the full_script sections into the narration text used for voiceover."""
+    full_script = package.get('full_script', {})
+    sections = [package.get('hook_script', '')] + [full_script.get(key, '') for key, _ in SCRIPT_SECTIONS]
+    return "\n\n".join(sections).strip()
+
+
+def section_path(section):
+    """Where an EDITABLE_SECTIONS key lives in the script package."""
+    return ("hook_script",) if section == "hook" else ("full_script", section)
+
+
+def get_script_section(package, section):
+    node = package
+    for key in section_path(section):
+        node = node.get(key) if isinstance(node, dict) else None
+    return node if isinstance(node, str) else ""
+
+
+def splice_script_section(package, section, text):
+    """Returns a copy of package with one section replaced; everything else is reused untouched."""
+    spliced = copy.deepcopy(package)
+    *parents, leaf = section_path(section)
+    node = spliced
+    for key in parents:
+        node = node.setdefault(key, {})
+    node[leaf] = text
+    if "unresolved" in spliced:
+        spliced["unresolved"] = [path for path in spliced["unresolved"] if path != ".".join(section_path(section))]
+        if not spliced["unresolved"]:
+            del spliced["unresolved"]
+    return spliced
+
+
+def build_section_prompt(topic, package, section, angle, matrix, source_type, length, direction=""):
+    keys = [key for key, _ in EDITABLE_SECTIONS]
+    labels = dict(EDITABLE_SECTIONS)
+    index = keys.index(section)
+    current = get_script_section(package, section)
+    previous = get_script_section(package, keys[index - 1]) if index > 0 else ""
+    following = get_script_section(package, keys[index + 1]) if index + 1 < len(keys) else ""
+    return f"""
+    TOPIC: {topic}
+    SOURCE TYPE: {source_type}
+    VIDEO LENGTH: {length}
+    CREATOR'S DRAFT / UNIQUE ANGLE: {angle}
+    SELECTED MATRIX (Tone/Style): {matrix}
+
+    PRECEDING SECTION{f" ({labels[keys[index - 1]]})" if previous else ""}:
+    {previous or "(none - this section opens the video)"}
+
+    CURRENT {labels[section].upper()} (to be replaced):
+    {current or "(empty)"}
+
+    FOLLOWING SECTION{f" ({labels[keys[index + 1]]})" if following else ""}:
+    {following or "(none - this section closes the video)"}
+
+    TASK: You are a professional, conversational YouTube scriptwriter. Rewrite ONLY the {labels[section]} of this script so it sounds like a real person talking to a camera.
+    It must flow naturally out of the preceding section and into the following one, without repeating them.
+    Keep it roughly the same length (about {max(len(current.split()), 20)} words).
+    {f"CREATOR'S DIRECTION FOR THIS REWRITE: {direction}" if direction.strip() else ""}
+    Return ONLY the new {labels[section]} text, with no heading, labels, quotes or commentary.
+    """
+
+
+@traced("script.section")
+def regenerate_script_section(mode, topic, package, section, angle, matrix, source_type, length, api_key, direction="", refresh_cache=True):
+    """Rewrites a single section using only its neighbours as context.
+
+    Returns the new section text, or an "Error: ..." string. A regeneration is
+    meant to produce a fresh take, so the response cache is bypassed by default.
+    """
+    annotate(section=section)
+    prompt = build_section_prompt(topic, package, section, angle, matrix, source_type, length, direction)
+    result = call_gemini(api_key, prompt, SCRIPT_PERSONAS.get(mode), call_type="script", refresh_cache=refresh_cache)
+    if result.startswith("Error:"):
+        return record_stage_result(result)
+    text = result.replace("```", "").strip().strip('"').strip()
+    if not text:
+        return record_stage_result("Error: The model returned an empty section.")
+    logger.info("Regenerated %s for %r: prompt ~%d tokens, response ~%d tokens",
+                section, topic, estimate_tokens(prompt), estimate_tokens(text))
+    return text
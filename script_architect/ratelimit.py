@@ -0,0 +1,193 @@
+"""Process-wide Gemini rate limiting: token buckets per API key with a priority queue.
+
+Every Gemini request waits in its key's queue until both the requests-per-minute
+and the tokens-per-minute bucket can cover it. Interactive requests are granted
+before background and batch work. A 429 pauses the whole key for its Retry-After,
+so sessions and batch workers back off together instead of retrying in lockstep.
+
+The limiter lives on the shared runtime loop. Callers pick a priority with
+request_priority(); the context variable follows them from their thread into
+the runtime tasks that make the calls.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+GEMINI_RPM = float(os.environ.get("GEMINI_RPM", "60"))
+GEMINI_TPM = float(os.environ.get("GEMINI_TPM", "1000000"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 16.0
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background", PRIORITY_BATCH: "batch"}
+
+_priority = contextvars.ContextVar("gemini_request_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority):
+    """Runs the enclosed Gemini calls at the given priority."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff, so callers that failed together retry apart."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class RateLimiter:
+    """Token buckets for one API key. rpm/tpm of 0 disable that bucket."""
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = rpm
+        self._tokens = tpm
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._order = itertools.count()
+        self._changed = asyncio.Event()
+        self._dispatcher = None
+        self.granted = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _seconds_until_available(self, tokens):
+        delay = self._paused_until - time.monotonic()
+        if self.rpm and self._requests < 1:
+            delay = max(delay, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            delay = max(delay, (tokens - self._tokens) * 60 / self.tpm)
+        return delay
+
+    async def acquire(self, tokens, priority=None):
+        """Waits for this request's turn and charges it to the buckets."""
+        if priority is None:
+            priority = current_priority()
+        # A prompt larger than a whole minute's budget must still get through eventually.
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        future = asyncio.get_running_loop().create_future()
+        enqueued = time.monotonic()
+        heapq.heappush(self._waiters, (priority, next(self._order), tokens, future))
+        self._wake()
+        await future
+        waited = time.monotonic() - enqueued
+        self.granted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def try_acquire(self, tokens):
+        """Charges a request only if it can go right now without overtaking anyone; never waits."""
+        self._refill()
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        if any(not future.done() for _, _, _, future in self._waiters) or self._seconds_until_available(tokens) > 0:
+            return False
+        if self.rpm:
+            self._requests -= 1
+        self._tokens -= tokens
+        self.granted += 1
+        return True
+
+    def record(self, tokens):
+        """Charges tokens that are only known after the call, such as the response."""
+        self._refill()
+        if self.tpm:
+            self._tokens -= tokens
+
+    def penalize(self, seconds):
+        """Pauses every request on this key, e.g. for a 429's Retry-After."""
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._wake()
+
+    def _wake(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        else:
+            self._changed.set()
+
+    async def _dispatch(self):
+        while self._waiters:
+            priority, order, tokens, future = self._waiters[0]
+            if future.done():
+                # The caller was cancelled while queued.
+                heapq.heappop(self._waiters)
+                continue
+            self._refill()
+            delay = self._seconds_until_available(tokens)
+            if delay <= 0:
+                heapq.heappop(self._waiters)
+                if self.rpm:
+                    self._requests -= 1
+                self._tokens -= tokens
+                future.set_result(None)
+                continue
+            # Sleep until the head can go, or until a new waiter or a 429 changes the picture.
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in list(self._waiters):
+            if not future.done():
+                queued[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {
+            "queued": sum(queued.values()),
+            "queued_by_priority": queued,
+            "granted": self.granted,
+            "mean_wait_s": self.total_wait / self.granted if self.granted else 0.0,
+            "max_wait_s": self.max_wait,
+            "throttled": self.throttled,
+            "paused_for_s": max(0.0, self._paused_until - time.monotonic()),
+        }
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(api_key):
+    """Returns the process-wide RateLimiter for api_key, shared by every session and batch worker."""
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+        if limiter is None:
+            limiter = _limiters[api_key] = RateLimiter()
+        return limiter
+
+
+def rate_limiter_stats(api_key):
+    """Queue depth and wait statistics for api_key, or None before its first request."""
+    with _limiters_lock:
+        limiter = _limiters.get(api_key)
+    return limiter.stats() if limiter else None
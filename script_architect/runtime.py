@@ -0,0 +1,129 @@
+"""One long-lived asyncio event loop per process, running on a background thread.
+
+All network I/O (Gemini, Edge-TTS) runs as coroutines on this loop, so many
+sessions can have requests in flight without each holding a thread or
+creating and leaking its own event loop. Blocking callers such as the
+Streamlit script thread use run()/run_with_events(); coroutines already on
+the loop simply await. Inside a cancellable(event) block, a blocking call is
+cancelled on the loop, in-flight requests included, once event is set.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import queue
+import threading
+from concurrent.futures import CancelledError
+from contextlib import contextmanager
+
+_DONE = object()
+# How often a blocked caller inside cancellable() checks its cancel event.
+CANCEL_POLL_S = 0.1
+
+_cancel_event = contextvars.ContextVar("runtime_cancel_event", default=None)
+
+
+@contextmanager
+def cancellable(event):
+    """Blocking runtime calls made in this block raise CancelledError, and their coroutine is cancelled, once event is set."""
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+class AsyncRuntime:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._shutdown_hooks = []
+        self._thread = threading.Thread(target=self._run_loop, name="script-architect-runtime", daemon=True)
+        self._thread.start()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def in_loop_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, coro):
+        """Schedules coro on the loop from any thread and returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """Runs coro on the loop and blocks the calling thread until it finishes."""
+        if self.in_loop_thread():
+            coro.close()
+        return self.run_with_events(lambda emit: coro)
+
+    def run_with_events(self, make_coro, on_event=None):
+        """Runs make_coro(emit) on the loop and blocks until it finishes.
+
+        Every emit(*args) made by the coroutine is delivered as on_event(*args)
+        on the calling thread, in order, so callbacks can safely touch the UI.
+        If on_event raises (a Streamlit rerun surfaces as an exception from the
+        next st.* call in it), the work is cancelled. While waiting for the next
+        event the thread cannot be interrupted, so a rerun during a silent stretch
+        only cancels once the next event arrives, or not at all if none does.
+        Inside cancellable(event), setting event cancels it within CANCEL_POLL_S.
+        """
+        if self.in_loop_thread():
+            raise RuntimeError("Blocking on the runtime from its own loop would deadlock; await the coroutine instead.")
+        cancel = _cancel_event.get()
+        if cancel is not None and cancel.is_set():
+            raise CancelledError("cancelled before it started")
+        events = queue.Queue()
+        future = self.submit(make_coro(lambda *args: events.put(args)))
+        future.add_done_callback(lambda _: events.put(_DONE))
+        try:
+            while True:
+                try:
+                    item = events.get(timeout=None if cancel is None else CANCEL_POLL_S)
+                except queue.Empty:
+                    if cancel.is_set():
+                        raise CancelledError("cancelled by the caller")
+                    continue
+                if item is _DONE:
+                    return future.result()
+                if on_event is not None:
+                    on_event(*item)
+        except BaseException:
+            future.cancel()
+            raise
+
+    def add_shutdown_hook(self, make_coro):
+        """Registers a coroutine factory that is awaited on the loop before it stops."""
+        self._shutdown_hooks.append(make_coro)
+
+    def close(self):
+        if not self.loop.is_running():
+            return
+
+        async def shutdown():
+            for make_coro in self._shutdown_hooks:
+                try:
+                    await make_coro()
+                except Exception:
+                    pass
+
+        try:
+            self.submit(shutdown()).result(timeout=5)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime():
+    """Returns the process-wide AsyncRuntime, starting its loop thread on first use."""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = AsyncRuntime()
+            atexit.register(_runtime.close)
+        return _runtime
@@ -0,0 +1,180 @@
+"""Background stage scheduler for speculative pipeline execution.
+
+A stage is a named callable plus a fingerprint of its inputs. It starts as soon
+as the stages it depends on have finished and receives their results as keyword
+arguments. Resubmitting a stage with different inputs cancels it, and
+transitively everything downstream of it, so speculative work never outlives
+the inputs it was started for. A stage whose result holds a resource (e.g. a
+spill file) passes release, which gets the result once nothing can use it.
+Cancelling a running stage cancels the Gemini and Edge-TTS requests it is
+blocked on, so superseded work stops using quota.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from script_architect.runtime import cancellable
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_WORKERS = int(os.environ.get("SCHEDULER_WORKERS", "8"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_shared_executor():
+    """Returns the process-wide pool that bounds background work across all sessions."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SCHEDULER_WORKERS, thread_name_prefix="stage")
+        return _executor
+
+
+def make_fingerprint(name, inputs, dep_fingerprints=()):
+    material = json.dumps([name, inputs, list(dep_fingerprints)], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class StageRun:
+    """One submission of a stage: pending -> running -> done | failed, or cancelled at any point."""
+
+    def __init__(self, name, fn, inputs, deps, fingerprint, release=None):
+        self.name = name
+        self.fn = fn
+        self.release = release
+        self.cancel_event = threading.Event()
+        self.inputs = inputs
+        self.deps = tuple(deps)
+        self.fingerprint = fingerprint
+        self.state = "pending"
+        self.result = None
+        self.error = None
+        self.dep_results = {}
+        self.future = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+
+class StageScheduler:
+    """Runs named stages in the background as soon as their dependencies are done."""
+
+    def __init__(self, executor=None):
+        self._executor = executor or get_shared_executor()
+        self._runs = {}
+        self._lock = threading.RLock()
+
+    def submit(self, name, fn, inputs, deps=(), release=None):
+        """Schedules fn(**dep_results) for these inputs and returns its StageRun.
+
+        Submitting the same inputs again is a no-op; new inputs cancel the
+        previous run of this stage and of every stage downstream of it.
+        release(result) is called when a result is superseded or cancelled,
+        including one that a detached run delivers after it was cancelled.
+        """
+        with self._lock:
+            dep_fingerprints = [self._runs[dep].fingerprint if dep in self._runs else None for dep in deps]
+            fingerprint = make_fingerprint(name, inputs, dep_fingerprints)
+            current = self._runs.get(name)
+            if current is not None and current.fingerprint == fingerprint and current.state != "failed":
+                return current
+            self._invalidate(name)
+            run = self._runs[name] = StageRun(name, fn, inputs, deps, fingerprint, release)
+            self._maybe_start(run)
+            return run
+
+    def get(self, name):
+        with self._lock:
+            return self._runs.get(name)
+
+    def cancel(self, name):
+        with self._lock:
+            self._invalidate(name)
+
+    def cancel_all(self):
+        with self._lock:
+            for name in list(self._runs):
+                self._invalidate(name)
+
+    def status(self):
+        with self._lock:
+            return [
+                {"stage": run.name, "state": run.state, "fingerprint": run.fingerprint, "elapsed": run.elapsed, "error": run.error}
+                for run in self._runs.values()
+            ]
+
+    def _invalidate(self, name):
+        run = self._runs.pop(name, None)
+        if run is None:
+            return
+        # A running thread is detached and its result discarded. Its blocking runtime
+        # calls see the cancel event and cancel their requests on the loop.
+        run.cancel_event.set()
+        if run.future is not None:
+            run.future.cancel()
+        if run.state in ("pending", "running"):
+            run.state = "cancelled"
+        elif run.state == "done":
+            self._release(run, run.result)
+        for other in list(self._runs.values()):
+            if name in other.deps:
+                self._invalidate(other.name)
+
+    def _maybe_start(self, run):
+        if run.state != "pending":
+            return
+        deps = [self._runs.get(dep) for dep in run.deps]
+        if any(dep is None or dep.state in ("pending", "running") for dep in deps):
+            return
+        failed = [dep.name for dep in deps if dep.state != "done"]
+        if failed:
+            self._finish(run, error=f"upstream stage failed: {', '.join(failed)}")
+            return
+        run.dep_results = {dep.name: dep.result for dep in deps}
+        run.state = "running"
+        run.started_at = time.time()
+        run.future = self._executor.submit(self._execute, run)
+
+    def _execute(self, run):
+        try:
+            with cancellable(run.cancel_event):
+                result, error = run.fn(**run.dep_results), None
+        except Exception as e:
+            result, error = None, str(e) or e.__class__.__name__
+        with self._lock:
+            if self._runs.get(run.name) is run:
+                self._finish(run, result, error)
+            elif error is None:
+                # Cancelled while running: nobody will ever read this result.
+                self._release(run, result)
+
+    @staticmethod
+    def _release(run, result):
+        if run.release is None or result is None:
+            return
+        try:
+            run.release(result)
+        except Exception:
+            logger.exception("Releasing the result of stage %r failed", run.name)
+
+    def _finish(self, run, result=None, error=None):
+        run.result = result
+        run.error = error
+        run.state = "failed" if error else "done"
+        run.finished_at = time.time()
+        for other in list(self._runs.values()):
+            if run.name in other.deps:
+                self._maybe_start(other)
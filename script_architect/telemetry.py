@@ -0,0 +1,266 @@
+"""Lightweight tracing spans and counters for every pipeline stage.
+
+    with span("script", topic=topic) as s:
+        ...
+        s.set(response_chars=len(text))
+    count("gemini_retries", call_type="research")
+
+Spans nest through a context variable, which follows calls from a caller's
+thread into the shared runtime loop. So a gemini.call span lands under the
+stage that made it. Finished spans are kept in memory for the diagnostics
+panel. They can be exported as JSON lines (TELEMETRY_JSONL, appended as spans
+finish) and as a Prometheus textfile (TELEMETRY_PROM, rewritten at most every
+TELEMETRY_PROM_INTERVAL seconds).
+"""
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+TELEMETRY_JSONL = os.environ.get("TELEMETRY_JSONL", "")
+TELEMETRY_PROM = os.environ.get("TELEMETRY_PROM", "")
+TELEMETRY_PROM_INTERVAL = float(os.environ.get("TELEMETRY_PROM_INTERVAL", "15"))
+RECENT_SPANS = 1000
+DURATION_WINDOW = 500
+DURATION_BUCKETS = [0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300]
+METRIC_PREFIX = "script_architect"
+
+_current_span = contextvars.ContextVar("telemetry_span", default=None)
+
+
+class Span:
+    def __init__(self, name, parent, attrs):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = dict(attrs)
+        self.status = "ok"
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, **amounts):
+        """Accumulates numeric attributes, e.g. tokens over several attempts."""
+        for key, value in amounts.items():
+            self.attrs[key] = self.attrs.get(key, 0) + value
+
+    def fail(self, error):
+        self.status = "error"
+        self.attrs["error"] = str(error)[:300] or type(error).__name__
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_s": self.duration,
+            "status": self.status,
+            "attrs": self.attrs,
+        }
+
+
+class Telemetry:
+    def __init__(self, jsonl_path=TELEMETRY_JSONL, prom_path=TELEMETRY_PROM):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.recent = deque(maxlen=RECENT_SPANS)
+        self._durations = {}
+        self._buckets = {}
+        self._totals = {}
+        self._errors = {}
+        self._counters = {}
+        self._prom_written = 0.0
+        self._lock = threading.Lock()
+
+    def finish(self, span):
+        span.duration = time.perf_counter() - span._started
+        with self._lock:
+            self.recent.append(span)
+            self._durations.setdefault(span.name, deque(maxlen=DURATION_WINDOW)).append(span.duration)
+            buckets = self._buckets.setdefault(span.name, [0] * len(DURATION_BUCKETS))
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    buckets[index] += 1
+            count, total = self._totals.get(span.name, (0, 0.0))
+            self._totals[span.name] = (count + 1, total + span.duration)
+            if span.status == "error":
+                self._errors[span.name] = self._errors.get(span.name, 0) + 1
+            write_prom = self.prom_path and time.monotonic() - self._prom_written >= TELEMETRY_PROM_INTERVAL
+            if write_prom:
+                self._prom_written = time.monotonic()
+        if self.jsonl_path:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+        if write_prom:
+            self.write_prometheus(self.prom_path)
+
+    def reset(self):
+        """Forgets every span and counter, e.g. between benchmark scenarios."""
+        with self._lock:
+            self.recent.clear()
+            for store in (self._durations, self._buckets, self._totals, self._errors, self._counters):
+                store.clear()
+
+    def count(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def stage_stats(self):
+        """Per span name: count, errors, mean/p50/p95/max seconds over the recent window."""
+        with self._lock:
+            names = sorted(self._totals)
+            durations = {name: sorted(self._durations[name]) for name in names}
+            totals = dict(self._totals)
+            errors = dict(self._errors)
+        stats = {}
+        for name in names:
+            ordered = durations[name]
+            count, total = totals[name]
+            stats[name] = {
+                "count": count,
+                "errors": errors.get(name, 0),
+                "mean_s": total / count,
+                "p50_s": ordered[len(ordered) // 2],
+                "p95_s": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                "max_s": ordered[-1],
+            }
+        return stats
+
+    def counters(self):
+        with self._lock:
+            return {
+                name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else ""): value
+                for (name, labels), value in sorted(self._counters.items())
+            }
+
+    def to_jsonl(self):
+        with self._lock:
+            spans = list(self.recent)
+        return "".join(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+
+    def to_prometheus(self):
+        def label_text(labels):
+            return ",".join(f'{key}="{escape_label(value)}"' for key, value in labels)
+
+        with self._lock:
+            buckets = {name: list(counts) for name, counts in self._buckets.items()}
+            totals = dict(self._totals)
+            errors = dict(self._errors)
+            counters = dict(self._counters)
+
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_duration_seconds Wall-clock time per pipeline stage span.",
+            f"# TYPE {METRIC_PREFIX}_stage_duration_seconds histogram",
+        ]
+        for name in sorted(totals):
+            stage = label_text([("stage", name)])
+            for bound, value in zip(DURATION_BUCKETS, buckets[name]):
+                lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{{stage},le="{bound}"}} {value}')
+            lines.append(f'{METRIC_PREFIX}_stage_duration_seconds_bucket{{{stage},le="+Inf"}} {totals[name][0]}')
+            lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_sum{{{stage}}} {totals[name][1]:.6f}")
+            lines.append(f"{METRIC_PREFIX}_stage_duration_seconds_count{{{stage}}} {totals[name][0]}")
+        lines.append(f"# HELP {METRIC_PREFIX}_stage_errors_total Stage spans that ended in an error.")
+        lines.append(f"# TYPE {METRIC_PREFIX}_stage_errors_total counter")
+        for name in sorted(totals):
+            lines.append(f"{METRIC_PREFIX}_stage_errors_total{{{label_text([('stage', name)])}}} {errors.get(name, 0)}")
+        for counter in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {METRIC_PREFIX}_{counter}_total counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == counter:
+                    suffix = f"{{{label_text(labels)}}}" if labels else ""
+                    lines.append(f"{METRIC_PREFIX}_{counter}_total{suffix} {value}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Writes the Prometheus textfile now, regardless of TELEMETRY_PROM_INTERVAL."""
+        if self.prom_path:
+            self.write_prometheus(self.prom_path)
+
+    def write_prometheus(self, path):
+        """Writes the textfile atomically so a collector never reads half a file."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry():
+    """Returns the process-wide Telemetry shared by every session."""
+    return _telemetry
+
+
+@contextmanager
+def span(name, **attrs):
+    """Times the enclosed block as a span nested under the current one; errors mark it failed and propagate."""
+    current = Span(name, _current_span.get(), attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        _telemetry.finish(current)
+
+
+def traced(name):
+    """Decorator form of span() for a whole function; the body adds attributes through current_span()."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def run_async(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return run_async
+
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return run
+    return decorate
+
+
+def current_span():
+    """The innermost open span, or None outside any span."""
+    return _current_span.get()
+
+
+def annotate(**attrs):
+    """Sets attributes on the current span, if there is one."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def mark_failed(error):
+    """Marks the current span failed for errors that are returned rather than raised."""
+    current = _current_span.get()
+    if current is not None:
+        current.fail(error)
+
+
+def count(name, value=1, **labels):
+    _telemetry.count(name, value, **labels)
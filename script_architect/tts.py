@@ -0,0 +1,344 @@
+"""Edge-TTS voiceover synthesis: chunked, concurrent, and backed by a paragraph-level audio cache."""
+
+import asyncio
+import atexit
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+import uuid
+from collections import OrderedDict
+
+from script_architect.runtime import get_runtime
+from script_architect.telemetry import annotate, count, span
+
+VOICES = [
+    ("en-US-ChristopherNeural", "Christopher (Male - Deep/Professional)"),
+    ("en-US-GuyNeural", "Guy (Male - Natural/Conversational)"),
+    ("en-US-EricNeural", "Eric (Male - Casual)"),
+    ("en-US-RogerNeural", "Roger (Male - Confident)"),
+    ("en-US-SteffanNeural", "Steffan (Male - Expressive)"),
+    ("en-US-AndrewNeural", "Andrew (Male - Warm)"),
+    ("en-US-BrianNeural", "Brian (Male - Crisp/News)"),
+    ("en-US-AriaNeural", "Aria (Female - Clear)"),
+    ("en-US-JennyNeural", "Jenny (Female - Conversational)"),
+    ("en-US-MichelleNeural", "Michelle (Female - Bright)"),
+    ("en-US-EmmaNeural", "Emma (Female - Friendly)"),
+    ("en-US-AvaNeural", "Ava (Female - Engaging)")
+]
+
+TTS_MAX_CHUNK_CHARS = 1200
+TTS_DEFAULT_CONCURRENCY = int(os.environ.get("TTS_CONCURRENCY", "4"))
+TTS_CACHE_PATH = os.environ.get(
+    "TTS_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "script_architect", "tts_cache.sqlite3")
+)
+TTS_CACHE_MAX_MB = float(os.environ.get("TTS_CACHE_MAX_MB", "256"))
+# Voiceovers larger than the threshold are held in an owned spill file instead of memory.
+TTS_SPILL_THRESHOLD_MB = float(os.environ.get("TTS_SPILL_THRESHOLD_MB", "16"))
+TTS_SPILL_MAX_MB = float(os.environ.get("TTS_SPILL_MAX_MB", "512"))
+TTS_SPILL_DIR = os.environ.get("TTS_SPILL_DIR", tempfile.gettempdir())
+
+
+class TTSCache:
+    """Disk-backed LRU cache of synthesized paragraph audio, keyed on (normalized text, voice)."""
+
+    def __init__(self, path, max_bytes):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tts_cache (
+                    key TEXT PRIMARY KEY,
+                    voice TEXT NOT NULL,
+                    audio BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    synth_seconds REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS tts_cache_last_used ON tts_cache (last_used)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def normalize(text):
+        return " ".join(unicodedata.normalize("NFC", text).split())
+
+    @classmethod
+    def make_key(cls, text, voice):
+        return hashlib.sha256(f"{voice}\x00{cls.normalize(text)}".encode("utf-8")).hexdigest()
+
+    def get(self, text, voice):
+        key = self.make_key(text, voice)
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT audio, synth_seconds FROM tts_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE tts_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            self.seconds_saved += row[1]
+            return bytes(row[0])
+
+    def put(self, text, voice, audio, synth_seconds):
+        key = self.make_key(text, voice)
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tts_cache (key, voice, audio, size, synth_seconds, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, voice, sqlite3.Binary(audio), len(audio), synth_seconds, time.time())
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM tts_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM tts_cache ORDER BY last_used ASC"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM tts_cache WHERE key = ?", stale)
+
+    def stats(self):
+        with self._lock, self._connect() as conn:
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tts_cache").fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+                "entries": entries,
+                "bytes": size,
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache():
+    """Returns the process-wide TTSCache, opening it on first use."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache(TTS_CACHE_PATH, int(TTS_CACHE_MAX_MB * 1024 * 1024))
+        return _cache
+
+
+class AudioSpill:
+    """Holds finished voiceovers: small ones as bytes, large ones in spill files this process owns.
+
+    Spill files live in a private directory that is removed at exit, and their
+    total size is capped; the oldest files are deleted first when it is exceeded.
+    """
+
+    def __init__(self, parent, threshold_bytes, max_bytes):
+        self.parent = parent
+        self.threshold_bytes = threshold_bytes
+        self.max_bytes = max_bytes
+        self.directory = None
+        self._files = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hold(self, audio):
+        """Returns audio itself, or the path of the spill file it was moved to."""
+        if len(audio) <= self.threshold_bytes:
+            return audio
+        with self._lock:
+            if self.directory is None:
+                os.makedirs(self.parent, exist_ok=True)
+                self.directory = tempfile.mkdtemp(prefix="script_architect_audio_", dir=self.parent)
+            path = os.path.join(self.directory, f"{uuid.uuid4().hex}.mp3")
+            with open(path, "wb") as f:
+                f.write(audio)
+            self._files[path] = len(audio)
+            while sum(self._files.values()) > self.max_bytes and len(self._files) > 1:
+                stale, _ = self._files.popitem(last=False)
+                self._remove(stale)
+            return path
+
+    def release(self, held):
+        """Deletes the spill file behind held, if there is one."""
+        if not isinstance(held, str):
+            return
+        with self._lock:
+            if self._files.pop(held, None) is not None:
+                self._remove(held)
+
+    def read(self, held):
+        """Returns the audio bytes for held, or None once its spill file has been evicted."""
+        if not isinstance(held, str):
+            return held
+        try:
+            with open(held, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def cleanup(self):
+        with self._lock:
+            self._files.clear()
+            if self.directory is not None:
+                shutil.rmtree(self.directory, ignore_errors=True)
+                self.directory = None
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+_spill = None
+_spill_lock = threading.Lock()
+
+
+def get_audio_spill():
+    """Returns the process-wide AudioSpill; its files are removed when the process exits."""
+    global _spill
+    with _spill_lock:
+        if _spill is None:
+            _spill = AudioSpill(
+                TTS_SPILL_DIR,
+                int(TTS_SPILL_THRESHOLD_MB * 1024 * 1024),
+                int(TTS_SPILL_MAX_MB * 1024 * 1024)
+            )
+            atexit.register(_spill.cleanup)
+        return _spill
+
+
+def split_script_paragraphs(text):
+    """Splits a script on blank lines into whitespace-normalized, speakable paragraphs."""
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = " ".join(paragraph.split())
+        if re.search(r"\w", paragraph):
+            paragraphs.append(paragraph)
+    return paragraphs
+
+
+def split_paragraph_for_tts(paragraph, max_chars=TTS_MAX_CHUNK_CHARS):
+    """Splits one paragraph into chunks at sentence, then word, boundaries."""
+    if len(paragraph) <= max_chars:
+        return [paragraph]
+
+    chunks = []
+    current = ""
+    for sentence in re.split(r"(?<=[.!?…])\s+", paragraph):
+        # A single run-on sentence longer than the limit is cut at the last space that fits.
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            if cut <= 0:
+                cut = max_chars
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip()
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def split_script_for_tts(text, max_chars=TTS_MAX_CHUNK_CHARS):
+    """Splits a script into ordered chunks at paragraph, then sentence, then word boundaries."""
+    return [chunk for paragraph in split_script_paragraphs(text) for chunk in split_paragraph_for_tts(paragraph, max_chars)]
+
+
+async def synthesize_chunk(text, voice, semaphore):
+    """Returns (audio, started, finished); the perf_counter times cover only the work after the semaphore is acquired."""
+    # Imported on first use so the app starts without loading the TTS stack.
+    import edge_tts
+
+    async with semaphore:
+        started = time.perf_counter()
+        for delay in [1, 2, 4]:
+            try:
+                audio = bytearray()
+                async for message in edge_tts.Communicate(text, voice).stream():
+                    if message["type"] == "audio":
+                        audio.extend(message["data"])
+                if not audio:
+                    raise RuntimeError("No audio received for chunk")
+                return bytes(audio), started, time.perf_counter()
+            except Exception:
+                if delay == 4:
+                    raise
+                count("tts_chunk_retries")
+                await asyncio.sleep(delay)
+
+
+async def text_to_speech_edge(text, voice, max_concurrency=TTS_DEFAULT_CONCURRENCY, on_progress=None, cache=None):
+    """Voices text chunk by chunk, straight from Communicate.stream() into memory, and returns the MP3 bytes."""
+    paragraphs = split_script_paragraphs(text)
+    if not paragraphs:
+        raise ValueError("No speakable text found in the script.")
+
+    # Only paragraphs missing from the cache are chunked and sent to Edge-TTS.
+    # SQLite access runs in a worker thread so the shared loop keeps serving other sessions.
+    paragraph_audio = [await asyncio.to_thread(cache.get, paragraph, voice) if cache else None for paragraph in paragraphs]
+    pending = {
+        index: split_paragraph_for_tts(paragraph)
+        for index, paragraph in enumerate(paragraphs)
+        if paragraph_audio[index] is None
+    }
+    total = sum(len(chunks) for chunks in pending.values())
+    annotate(paragraphs=len(paragraphs), cached_paragraphs=len(paragraphs) - len(pending), chunks=total)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    completed = 0
+
+    async def run(chunk):
+        nonlocal completed
+        result = await synthesize_chunk(chunk, voice, semaphore)
+        completed += 1
+        if on_progress:
+            on_progress(completed, total)
+        return result
+
+    async def run_paragraph(index, chunks):
+        results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+        audio = b"".join(chunk_audio for chunk_audio, _, _ in results)
+        if cache:
+            # Wall time from the first chunk starting to the last finishing: chunks run in
+            # parallel, and time spent queueing for the semaphore is not synthesis.
+            wall = max(finished for _, _, finished in results) - min(started for _, started, _ in results)
+            await asyncio.to_thread(cache.put, paragraphs[index], voice, audio, wall)
+        paragraph_audio[index] = audio
+
+    await asyncio.gather(*(run_paragraph(index, chunks) for index, chunks in pending.items()))
+
+    # Edge-TTS emits headerless MP3 frames, so concatenating the paragraph
+    # streams in their original order yields one continuous, gapless file.
+    audio = b"".join(paragraph_audio)
+    annotate(audio_bytes=len(audio))
+    count("tts_audio_bytes", len(audio), voice=voice)
+    return audio
+
+
+def generate_audio_sync(text, voice, max_concurrency=TTS_DEFAULT_CONCURRENCY, on_progress=None, cache=None):
+    """Synthesizes text on the shared runtime and returns the MP3 as bytes; on_progress runs on the calling thread."""
+    with span("tts", voice=voice, chars=len(text)):
+        return get_runtime().run_with_events(
+            lambda emit: text_to_speech_edge(text, voice, max_concurrency, emit if on_progress else None, cache),
+            on_progress
+        )